@@ -0,0 +1,178 @@
+import os
+import random
+import datetime
+
+import yaml
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+
+from utils.interactive import column_names
+from utils.preprocessing import NONE_MARKER, DATE_FORMAT
+
+
+# comments as they show up in real exports: codes, codes with text, free text,
+# numbers instead of codes and empty comments
+COMMENT_PATTERNS = [
+    "001 Abstimmung mit dem Kunden", "002", "003 Review der Spezifikation", "007",
+    "999: Sonderthema", "Dokumentation erstellt", "Meeting zu 004 und 001", 1, 5, None
+]
+
+# tasks of the client 2 and 3 reports, client 2 only uses the first word
+TASKS = ["Konzeption WorkItem 1", "Konzeption WorkItem 2", "Umsetzung", "Test", "Betrieb Support"]
+ADDITIONAL_TASKS = {2: {"Betrieb": "Umsetzung"}, 3: {"Betrieb Support": "Umsetzung"}}
+
+HOURS = [0.5, 1, 1.25, 2, 4, 7.75, 8]
+
+
+def client_specs(n_clients: int) -> list:
+    # client names and ids, the ids 1, 2 and 3 take turns
+    return [(f"BenchClient{i}", i % 3 + 1) for i in range(n_clients)]
+
+
+def employee_names(n_employees: int) -> list:
+    return [(f"Vorname{i}", f"Nachname{i}") for i in range(n_employees)]
+
+
+def task_sheets(client_id: int) -> list:
+    # the sheets a template needs, same mapping as normalize_task_name
+    sheets = []
+    for task in TASKS:
+        if client_id == 2:
+            task = task.split()[0]
+        task = ADDITIONAL_TASKS[client_id].get(task, task)
+        if task not in sheets:
+            sheets.append(task)
+    return sheets
+
+
+def generate_export(path: str, rows: int, employees: int = 20, clients: int = 3, wbs_codes: int = 4,
+                    months: int = 3, comment_patterns: list = None, seed: int = 0,
+                    first_month: datetime.date = datetime.date(2023, 1, 1)) -> None:
+    """
+    Writes a synthetic "Timesheet Hours" export with the columns of column_names.
+
+    Every row books hours of a random employee on a random wbs code of a random
+    client in one of the months starting at first_month. About 1 % of the rows
+    have no task and are ignored by the client 2 and 3 reports.
+    """
+    rnd = random.Random(seed)
+    comment_patterns = comment_patterns or COMMENT_PATTERNS
+    names = employee_names(employees)
+    projects = [(client, f"P-{c}{w:02d}", f"Projekt {c}/{w}")
+                for c, (client, _) in enumerate(client_specs(clients))
+                for w in range(wbs_codes)]
+    days = []
+    for m in range(months):
+        year = first_month.year + (first_month.month - 1 + m) // 12
+        month = (first_month.month - 1 + m) % 12 + 1
+        day = datetime.date(year, month, 1)
+        while day.month == month:
+            if day.weekday() < 5:
+                days.append(day.strftime(DATE_FORMAT))
+            day += datetime.timedelta(days=1)
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Timesheet Hours")
+    sheet.append(column_names)
+    for _ in range(rows):
+        first_name, last_name = rnd.choice(names)
+        client, project_code, project_name = rnd.choice(projects)
+        task = rnd.choice(TASKS) if rnd.random() > 0.01 else NONE_MARKER
+        sheet.append([rnd.choice(days), first_name, last_name,
+                      f"{first_name}.{last_name}@example.com".lower(), client, client[-3:],
+                      project_name, project_code, task, "TC", rnd.choice(HOURS),
+                      rnd.choice(comment_patterns), "Supervisor", None, None, None, None,
+                      "Remote", "Approved", "Approved"])
+    # exports end with a total row
+    sheet.append(["Total", None, None, None, None, None, None, None, None, None, None])
+    workbook.save(path)
+
+
+def generate_config(employees: int = 20, clients: int = 3) -> dict:
+    config = {
+        "logging": {"logs_dir": "logs", "level": "warning"},
+        "cache": {"enabled": False},
+        "Categories": {
+            "000": "Allgemein", "001": "Abstimmung", "002": "Projektmanagement",
+            "003": "Review", "004": "Konzeption", "005": "Umsetzung", "006": "Test",
+            "007": "Dokumentation", "999": "Sonstiges",
+            "additional_comments_for_codes": ["999"]
+        },
+        "Clients": {},
+        "Grades": {f"{first} {last}": ["Junior", "Senior", "Manager"][i % 3]
+                   for i, (first, last) in enumerate(employee_names(employees))}
+    }
+    for client, client_id in client_specs(clients):
+        if client_id == 1:
+            config["Clients"][client] = {
+                "id": 1,
+                "client_names": [client],
+                "skip_style": False,
+                "template_sheet_name": "template",
+                "max_range_rows": 45,
+                "references": {"weekday": [8, 1], "date": [8, 2], "hours": [8, 3], "description": [8, 4]},
+                "header_references": {"Mitarbeiter": "B2", "Projekt": "B3",
+                                      "Berichtsmonat": "B4", "Datum": "B5"}
+            }
+        else:
+            config["Clients"][client] = {
+                "id": client_id,
+                "client_names": [client],
+                "skip_style": True,
+                "additional_tasks": ADDITIONAL_TASKS[client_id],
+                "header_references": {task: f"B{row}"
+                                      for row, task in enumerate(task_sheets(client_id), 2)}
+            }
+    return config
+
+
+def generate_template(path: str, client_id: int) -> None:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    if client_id == 1:
+        sheet.title = "template"
+        thin = Side(style="thin")
+        for row in range(1, 46):
+            for column in range(1, 6):
+                cell = sheet.cell(row, column)
+                if row < 7:
+                    cell.font = Font(bold=True)
+                    cell.fill = PatternFill("solid", fgColor="DDDDDD")
+                else:
+                    cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+                    cell.alignment = Alignment(wrap_text=True)
+        for ref, value in {"A1": "Leistungsnachweis", "A2": "Mitarbeiter", "A3": "Projekt",
+                           "A4": "Berichtsmonat", "A5": "Datum", "A7": "Tag", "B7": "Datum",
+                           "C7": "Stunden", "D7": "Beschreibung", "C40": "=SUM(C8:C38)"}.items():
+            sheet[ref] = value
+        sheet.merge_cells("A1:E1")
+        sheet.merge_cells("D7:E7")
+        sheet.column_dimensions["D"].width = 60
+        sheet.row_dimensions[1].height = 30
+    else:
+        sheet.title = "Uebersicht"
+        sheet.append(["Task", "Stunden"])
+        for task in task_sheets(client_id):
+            task_sheet = workbook.create_sheet(task)
+            task_sheet.append(["Grade", "Datum", "Stunden", "Beschreibung"])
+            for row in range(2, 20):
+                task_sheet.cell(row, 1).fill = PatternFill("solid", fgColor="FFFF00")
+    workbook.save(path)
+
+
+def generate_environment(directory: str, rows: int, employees: int = 20, clients: int = 3,
+                         wbs_codes: int = 4, months: int = 3, comment_patterns: list = None,
+                         seed: int = 0) -> str:
+    """
+    Creates a working directory like the one of a real run: Template/ with the
+    config and one template per client, and the export. Returns the export path.
+    """
+    template_dir = os.path.join(directory, "Template")
+    os.makedirs(template_dir, exist_ok=True)
+    with open(os.path.join(template_dir, "config.yaml"), "w", encoding="utf-8") as file:
+        yaml.safe_dump(generate_config(employees, clients), file, sort_keys=False, allow_unicode=True)
+    for client, client_id in client_specs(clients):
+        generate_template(os.path.join(template_dir, f"template_{client}.xlsx"), client_id)
+    export = os.path.join(directory, "Timesheet Hours.xlsx")
+    generate_export(export, rows, employees, clients, wbs_codes, months, comment_patterns, seed)
+    return export
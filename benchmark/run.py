@@ -0,0 +1,159 @@
+"""
+Benchmarks the pipeline on synthetic Replicon Exports at several scales.
+
+Every scale runs in a fresh process: the export, config and templates are
+generated, the export is read and prepared once and the workbooks of all
+clients are created. The stages are timed with the spans of utils.metrics.
+
+    python -m benchmark.run --scales 1000 10000 50000
+    python -m benchmark.run --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmark.generate import generate_environment
+from utils.pipeline import load_config, load_export, generate_reports, ActivityClassifier
+from utils.metrics import stages, peak_memory_mb
+from utils.utils import timings
+
+
+parser = argparse.ArgumentParser(description="Benchmarks the pipeline on synthetic Replicon Exports.")
+parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 50000], metavar="ROWS",
+                    help="number of rows of the generated exports")
+parser.add_argument("--employees", type=int, default=20)
+parser.add_argument("--clients", type=int, default=3, help="client ids 1, 2 and 3 take turns")
+parser.add_argument("--wbs-codes", type=int, default=4, help="wbs codes per client")
+parser.add_argument("--months", type=int, default=3)
+parser.add_argument("--workers", type=int, default=1)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--baseline", default=os.path.join(os.path.dirname(__file__), "baseline.json"),
+                    help="results to compare with")
+parser.add_argument("--save-baseline", action="store_true",
+                    help="store the results as the new baseline")
+parser.add_argument("--threshold", type=float, default=0.2,
+                    help="relative slowdown reported as regression")
+parser.add_argument("--output", help="write the results as JSON")
+
+
+def stage_results(stage_dict: dict) -> dict:
+    results = {}
+    for name, stage in stage_dict.items():
+        results[name] = dict(stage)
+        if stage.get("rows") and stage["seconds"] > 0:
+            results[name]["rows_per_second"] = round(stage["rows"] / stage["seconds"], 1)
+    return results
+
+
+def run_scale(rows: int, options: dict) -> dict:
+    """
+    Runs the whole pipeline for an export with the given number of rows, meant to
+    run in a fresh process so the peak memory belongs to this scale only.
+    """
+    directory = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        export = generate_environment(directory, rows, options["employees"], options["clients"],
+                                      options["wbs_codes"], options["months"], seed=options["seed"])
+        config = load_config(os.path.join(directory, "Template", "config.yaml"))
+        logging.basicConfig(level=logging.WARNING, filename=os.path.join(directory, "benchmark.log"),
+                            force=True)
+        classifier = ActivityClassifier.from_config(config)
+        output_dir = os.path.join(directory, "output")
+
+        stages.clear()
+        timings.clear()
+        start = time.perf_counter()
+        data = load_export(export, classifier=classifier)
+        results = {"rows": rows, "stages": stage_results(stages), "clients": {}}
+
+        for client, client_info in config["Clients"].items():
+            stages.clear()
+            client_start = time.perf_counter()
+            template_path = os.path.join(directory, "Template", f"template_{client}.xlsx")
+            built, _ = generate_reports(data, client, config, classifier, template_path, output_dir,
+                                        workers=options["workers"], force=True)
+            results["clients"][client] = {
+                "id": client_info["id"],
+                "seconds": time.perf_counter() - client_start,
+                "workbooks": built,
+                "stages": stage_results(stages)
+            }
+
+        results["seconds"] = time.perf_counter() - start
+        results["rows_per_second"] = round(rows / results["seconds"], 1)
+        results["peak_memory_mb"] = peak_memory_mb()
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def flatten(result: dict) -> dict:
+    # seconds by name, e.g. "total", "preprocess" or "client id 2/fill"
+    seconds = {"total": result["seconds"]}
+    for name, stage in result["stages"].items():
+        seconds[name] = stage["seconds"]
+    for client in result["clients"].values():
+        for name, stage in client["stages"].items():
+            key = f"client id {client['id']}/{name}"
+            seconds[key] = seconds.get(key, 0) + stage["seconds"]
+    return seconds
+
+
+def print_results(results: dict, baseline: dict, threshold: float) -> bool:
+    # prints the results, compared with the baseline if there is one for the scale,
+    # returns whether there is a regression
+    regression = False
+    for scale, result in results.items():
+        print(f"\n{scale} rows: {round(result['seconds'], 3)} s, "
+              f"{result['rows_per_second']} rows/s, peak memory {result['peak_memory_mb']} MB")
+        before = flatten(baseline[scale]) if scale in baseline else {}
+        for name, seconds in flatten(result).items():
+            line = f"  {name:<32} {seconds:>10.3f} s"
+            if before.get(name):
+                ratio = seconds / before[name]
+                line += f"  {ratio:>6.2f}x baseline"
+                if ratio > 1 + threshold:
+                    line += "  REGRESSION"
+                    regression = True
+            print(line)
+    return regression
+
+
+def main():
+    args = parser.parse_args()
+    options = {"employees": args.employees, "clients": args.clients, "wbs_codes": args.wbs_codes,
+               "months": args.months, "workers": args.workers, "seed": args.seed}
+
+    results = {}
+    for rows in args.scales:
+        print(f"Running {rows} rows ...")
+        # a new process per scale, spawned to start without the memory of the last one
+        with ProcessPoolExecutor(max_workers=1,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            results[str(rows)] = pool.submit(run_scale, rows, options).result()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+    regression = print_results(results, baseline, args.threshold)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nSaved baseline to '{args.baseline}'.")
+    sys.exit(1 if regression else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,220 +1,233 @@
-import os
-import shutil
 import time
-import calendar
-import string
+# startup is measured from here, see STARTUP_BUDGET
+_start = time.perf_counter()
+
+import os
 import locale
 import logging
+import argparse
+from functools import partial
+
+import utils.utils
+from utils.utils import log_timings, pause
+from utils.metrics import span, add_span, log_stages, write_metrics, peak_memory_mb
+
+
+# seconds until the heavy modules (pandas, openpyxl) are imported and the config is loaded,
+# they are only imported after the arguments are parsed, so --help answers right away
+STARTUP_BUDGET = 1.5
+
+
+parser = argparse.ArgumentParser(description="Creates a 'Leistungsnachweis' from a Replicon Export.")
+parser.add_argument("--no-cache", action="store_true",
+                    help="parse the Replicon Export even if a cached version exists")
+parser.add_argument("--clear-cache", action="store_true",
+                    help="remove all cached Replicon Exports before running")
+parser.add_argument("--workers", type=int, default=1, metavar="N",
+                    help="number of processes creating output files in parallel, 0 uses all cores")
+parser.add_argument("--force", action="store_true",
+                    help="rebuild all output files, even if their inputs did not change")
+parser.add_argument("--export", action="append", dest="exports", metavar="PATH",
+                    help="Replicon Export to use instead of asking, can be given several times")
+parser.add_argument("--clients", nargs="+", metavar="CLIENT",
+                    help="clients to create reports for instead of asking, 'all' for every client")
+parser.add_argument("--no-tasks", choices=["export", "skip"],
+                    help="export or skip entries without task name instead of asking")
+parser.add_argument("--batch", action="store_true",
+                    help="run without any prompt, requires --export (or --merge-exports) and --clients")
+parser.add_argument("--dry-run", nargs="?", const="", metavar="PLAN",
+                    help="only print the planned output files and sheets, optionally also "
+                         "write the plan to PLAN (.json or .csv), nothing is written to output/")
+parser.add_argument("--merge-exports", action="store_true",
+                    help="load all exports (given by --export or found in the current directory) "
+                         "as one, bookings contained in several exports are kept once")
+parser.add_argument("--compression-level", type=int, choices=range(10), metavar="0-9",
+                    help="zip compression of the output files, 0 saves fastest and 9 smallest, "
+                         "overrides 'output.compression_level' of the config")
+parser.add_argument("--no-summary", action="store_true",
+                    help="do not write the summary workbook with the hours of all clients to output/")
+parser.add_argument("--chunk-size", type=int, metavar="ROWS",
+                    help="read the Replicon Export in chunks of ROWS rows to bound the memory, "
+                         "overrides 'ingestion.chunk_size' of the config")
+parser.add_argument("--max-memory", type=float, metavar="MB",
+                    help="abort reading the Replicon Export above MB megabytes of memory, "
+                         "reads in chunks of 50000 rows without --chunk-size, overrides 'ingestion.max_memory_mb' of the config")
+
+
+def main():
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else os.cpu_count()
+    if args.batch:
+        if not (args.exports or args.merge_exports) or not args.clients:
+            parser.error("--batch requires --export (or --merge-exports) and --clients")
+        utils.utils.interactive = False
+    # without a flag, the user is asked for every report with entries without task
+    export_no_tasks = {"export": True, "skip": False}.get(args.no_tasks, False if args.batch else None)
+
+    # heavy imports, see STARTUP_BUDGET
+    from utils.interactive import get_input, get_all_inputs, select_client, get_clients, handle_no_tasks,\
+                                  handle_unexpected_error
+    from utils.pipeline import load_config, load_exports, summarize_export, check_reports,\
+                               generate_reports, describe_reports, write_summary_workbook,\
+                               ActivityClassifier, ExportCache
+    from utils.execution import get_template, write_plan, print_plan
+    from utils.file_handling import create_folder
+    from utils.manifest import OutputManifest
+
+    # to get dates and times in German format
+    locale.setlocale(locale.LC_ALL, "de_DE")
+
+    cwd = os.getcwd()
+
+    # load configurations
+    config = load_config(os.path.join(cwd, "Template", "config.yaml"))
+    startup = time.perf_counter() - _start
+
+    # set up logging
+    logs_dir = config.get("logging").get("logs_dir", "logs")
+    log_level = config.get("logging").get("level", "info").upper()
+    os.makedirs(logs_dir, exist_ok=True)
+
+    log_file = os.path.abspath(os.path.join(logs_dir, "log_file.log"))
+    logging.basicConfig(level=log_level, format="%(asctime)s [%(levelname)s] %(message)s",
+                        filename=log_file, force=True)
+    logging.info("Execution started.")
+    add_span("startup", startup, {})
+    logging.info(f"Startup took {round(startup, 3)} s.")
+    if startup > STARTUP_BUDGET:
+        logging.warning(f"Startup took longer than the budget of {STARTUP_BUDGET} s.")
+
+    # maps the activity codes in the comments to activities, see the config
+    classifier = ActivityClassifier.from_config(config)
+
+    if args.clients:
+        clients = get_clients(config, args.clients)
+    else:
+        clients = [select_client(config)[0]]
+    if args.exports:
+        files = [os.path.abspath(file) for file in args.exports]
+    elif args.merge_exports:
+        files = [os.path.join(cwd, file) for file in get_all_inputs(cwd)]
+    else:
+        files = [os.path.join(cwd, get_input(cwd))]
+
+    # prepared DataFrames of already seen Replicon Exports are cached on disk
+    cache_config = config.get("cache", {})
+    cache = ExportCache(os.path.join(cwd, cache_config.get("dir", ".cache")),
+                        max_size_mb=cache_config.get("max_size_mb", 500),
+                        enabled=cache_config.get("enabled", True) and not args.no_cache)
+    if args.clear_cache:
+        cache.clear()
+
+    # large exports are read in chunks, only the rows of the selected clients are kept
+    # if every client names its values of "Client Name" in the config
+    ingestion = config.get("ingestion", {})
+    chunk_size = args.chunk_size or ingestion.get("chunk_size")
+    max_memory_mb = args.max_memory or ingestion.get("max_memory_mb")
+    client_names = None
+    if all(config["Clients"][client].get("client_names") for client in clients):
+        client_names = [name for client in clients for name in config["Clients"][client]["client_names"]]
+
+    # the output files are saved in the background, the compression trades file size for speed
+    output_config = config.get("output", {})
+    compression_level = args.compression_level
+    if compression_level is None:
+        compression_level = output_config.get("compression_level")
+
+    # get template excel sheets for styles, fails early if a template is missing
+    template_paths = {}
+    for client in clients:
+        template_paths[client] = os.path.join(cwd, "Template", f"template_{client}.xlsx")
+        with span("template"):
+            get_template(template_paths[client], client, config)
+
+    output_dir = os.path.join(cwd, "output")
+    dry_run = args.dry_run is not None
+    if not dry_run:
+        create_folder(output_dir)
 
-import openpyxl
-import pandas as pd
-
-from utils.interactive import get_input, handle_failed_input, select_client,\
-                                handle_no_tasks, handle_unexpected_error
-from utils.preprocessing import prepare_df, clean_name, merge_groups
-from utils.report import ClientReport1, ClientReport2
-from utils.style import adjust_cell_dimensions, copy_cell_styles, merge_cells
-from utils.validation import validate_input_file
-from utils.file_handling import create_folder, load_template, load_config
-
-
-# to get dates and times in German format
-locale.setlocale(locale.LC_ALL, "de_DE")
-
-cwd = os.getcwd()
-
-# load configurations
-config = load_config(os.path.join(cwd, "Template", "config.yaml"))
-
-# set up logging
-logs_dir = config.get("logging").get("logs_dir", "logs")
-log_level = config.get("logging").get("level", "info").upper()
-os.makedirs(logs_dir, exist_ok=True)
-
-log_file = os.path.join(logs_dir, "log_file.log")
-logging.basicConfig(level=log_level, format="%(asctime)s [%(levelname)s] %(message)s",
-                    filename=log_file, force=True)
-logging.info("Execution started.")
-
-CODE_TO_ACTIVITY = {
-    "000": config["Categories"].get("000"),
-    "001": config["Categories"].get("001"),
-    "002": config["Categories"].get("002"),
-    "003": config["Categories"].get("003"),
-    "004": config["Categories"].get("004"),
-    "005": config["Categories"].get("005"),
-    "006": config["Categories"].get("006"),
-    "007": config["Categories"].get("007"),
-    "999": config["Categories"].get("999")
-}
-# codes where the user wants store additional information (comments, the text after a ':')
-# after the corresponding code
-ADDITIONAL_COMMENTS = config["Categories"].get("additional_comments_for_codes")
-
-client, client_info = select_client(config)
-file = get_input(cwd)
-
-# check if the provided Replicon Export has english column names
-try:
-    validate_input_file(file)
-except TypeError:
-    logging.warning("User used non-german column names.")
-    handle_failed_input()
-
-# some preprocessing
-data = prepare_df(file)
-
-# get template excel sheet for styles
-template, template_sheet, skip_style = load_template(
-    os.path.join(cwd, "Template", f"template_{client}.xlsx"),
-    client,
-    config
-)
-if not skip_style:
-    template_cell_dimensions = {
-        "widths": {
-            col: template_sheet.column_dimensions[col].width for col in string.ascii_uppercase
-        },
-        "heights": {
-            row: template_sheet.row_dimensions[row].height for row in range(1,\
-                                    client_info.get("max_range_rows"))\
-                if template_sheet.row_dimensions[row].height is not None
-        }
-    }
-    template_merged_cells = template_sheet.merged_cells.ranges
-
-create_folder("output", os.path.join(cwd, "output"))
-
-# get all available clients
-client_groups = data.groupby(data["Client Name"])
-
-
-if __name__ == "__main__":
     start = time.time()
     try:
-        # client level (folder)
-        for i, (client_name, group) in enumerate(client_groups, 1):
-            create_folder(str(client_name), os.path.join(cwd, "output", str(client_name)))
-
-            wbs_groups = group.groupby(group["Project Code"])
-            # wbs code level (folder)
-            for wbs, wbs_group in wbs_groups:
-                project_name = data.loc[data["Project Code"] == wbs, "Project Name"].values[0]
-                clean_project_name = clean_name(project_name)
-                create_folder(f"{wbs} ({clean_project_name})")
-
-                # -- CLIENT 1 --
-                if client_info.get("id") == 1:
-                    year_groups = wbs_group.groupby(wbs_group["Entry Date"].dt.year)
-                    # year level (folder)
-                    for year, year_group in year_groups:
-                        create_folder(str(int(year)))
-                        
-                        month_groups = year_group.groupby(year_group["Entry Date"].dt.month)
-                        # month level (excel file)
-                        for month, month_group in month_groups:
-                            shutil.copy(os.path.join(cwd,
-                                                    "Template", f"template_{client}.xlsx"),
-                                                    f"{calendar.month_name[month]}.xlsx")
-                            month_excel = openpyxl.load_workbook(f"{calendar.month_name[month]}.xlsx")
-
-                            employee_groups = month_group.groupby(month_group["Last Name"])
-                            # employee level (excel sheet in the file)
-                            # creates report for every employee
-                            for employee, employee_group in employee_groups:
-                                first_name = employee_group["First Name"].values[0]
-                                employee_sheet = month_excel.create_sheet(f"{first_name} {employee}")
-                                # call functions to copy style and values
-                                merge_cells(employee_sheet, template_merged_cells)
-                                copy_cell_styles(template_sheet, employee_sheet)
-                                adjust_cell_dimensions(employee_sheet, template_cell_dimensions)
-                                report = ClientReport1(employee_group,
-                                                    month=month,
-                                                    year=year,
-                                                    employee_name=f"{first_name} {employee}",
-                                                    project_name=clean_project_name,
-                                                    references=client_info.get("references"),
-                                                    header_references=client_info.get("header_references"))
-                                report.fill_worksheet(employee_sheet, CODE_TO_ACTIVITY, ADDITIONAL_COMMENTS)
-                                report.fill_header(employee_sheet)
-
-                            month_excel.remove(month_excel["template"])
-                            month_excel.save(f"{calendar.month_name[month]}.xlsx")
-                            
-                        os.chdir("..")
-                    os.chdir("..")
-                # -- END CLIENT 1 --
-
-                # -- START CLIENT 2 --
-                elif client_info.get("id") == 2:
-                    shutil.copy(os.path.join(cwd,
-                                            "Template", f"template_{client}.xlsx"),
-                                            f"{client}_Stundenaufstellung.xlsx")
-                    output_excel = openpyxl.load_workbook(f"{client}_Stundenaufstellung.xlsx")
-                    
-                    no_tasks = wbs_group[pd.isna(wbs_group["Task Name"])]
-                    handle_no_tasks(no_tasks)
-
-                    wbs_group.dropna(subset=["Task Name"], inplace=True)
-
-                    task_name_groups = wbs_group.groupby(wbs_group["Task Name"])
-                    # some tasks belong together, merge them and sort by date before
-                    # creating the report
-                    merged_groups = merge_groups(task_name_groups,
-                                                client_info,
-                                                long_task_name=True)
-
-                    # create report for every task
-                    for task_name, task_name_group in merged_groups.items():
-                        task_sheet = output_excel[task_name]
-                        report = ClientReport2(task_name_group,
-                                            task_name=task_name,
-                                            grades=config.get("Grades"),
-                                            header_references=client_info.get("header_references"))
-                        report.fill_worksheet(task_sheet, CODE_TO_ACTIVITY, ADDITIONAL_COMMENTS)
-                        report.fill_header(output_excel["Uebersicht"])
-                    
-                    output_excel.save(f"{client}_Stundenaufstellung.xlsx")
-                    # -- END CLIENT 2 --
-
-                    # -- START CLIENT 3 --
-                elif client_info.get("id") == 3:
-                    shutil.copy(os.path.join(cwd,
-                                            "Template", f"template_{client}.xlsx"),
-                                            f"{client}_Stundenaufstellung.xlsx")
-                    output_excel = openpyxl.load_workbook(f"{client}_Stundenaufstellung.xlsx")
-                    
-                    no_tasks = wbs_group[pd.isna(wbs_group["Task Name"])]
-                    handle_no_tasks(no_tasks)
-
-                    wbs_group.dropna(subset=["Task Name"], inplace=True)
-
-                    task_name_groups = wbs_group.groupby(wbs_group["Task Name"])
-                    # some tasks belong together, merge them and sort by date before
-                    # creating the report             
-                    merged_groups = merge_groups(task_name_groups,
-                                                client_info,
-                                                long_task_name=False)
-
-                    # create report for every task
-                    for task_name, task_name_group in merged_groups.items():
-                        task_sheet = output_excel[task_name]
-                        report = ClientReport2(task_name_group,
-                                            task_name=task_name,
-                                            grades=config.get("Grades"),
-                                            header_references=client_info.get("header_references"))
-                        report.fill_worksheet(task_sheet, CODE_TO_ACTIVITY, ADDITIONAL_COMMENTS)
-                        report.fill_header(output_excel["Uebersicht"])
-                    
-                    output_excel.save(f"{client}_Stundenaufstellung.xlsx")
-                    # -- END CLIENT 3 --
-
-            os.chdir("..")
-            print(f"Progress: {round((i/len(client_groups))*100, 2)} %", end="\r")
-    
+        rows, built, skipped = 0, 0, 0
+        plan = []
+        manifest = OutputManifest(output_dir)
+        # merged exports are parsed in parallel and handled as one export
+        groups = [files] if args.merge_exports else [[file] for file in files]
+        # the reports of several exports would overwrite each other (e.g. the files
+        # per wbs code), every export gets its own folder in output/
+        folders = []
+        for group in groups:
+            stem = "merged" if len(group) > 1 else os.path.splitext(os.path.basename(group[0]))[0]
+            folder, n = stem, 2
+            while folder in folders:
+                folder, n = f"{stem} ({n})", n + 1
+            folders.append(folder)
+        for group, folder in zip(groups, folders):
+            export_dir = output_dir if len(groups) == 1 else os.path.join(output_dir, folder)
+            # every export is read once and used for all clients
+            data = load_exports(group, cache, classifier, workers=workers, log_file=log_file,
+                                log_level=log_level, chunk_size=chunk_size,
+                                client_names=client_names, max_memory_mb=max_memory_mb)
+            name = ", ".join(os.path.basename(file) for file in group)
+            rows += len(data)
+            # hours by client, wbs code, task, employee and month, shared by all clients
+            cube = summarize_export(data)
+            if dry_run:
+                for client in clients:
+                    records = describe_reports(data, client, config, classifier, template_paths[client],
+                                               export_dir, manifest=None if args.force else manifest,
+                                               cube=cube)
+                    plan += [{**record, "file": os.path.relpath(os.path.join(export_dir, record["file"]),
+                                                                output_dir)} for record in records]
+                continue
+            # all clients are checked before the first workbook is written
+            for client in clients:
+                check_reports(data, client, config, template_paths[client])
+            for client in clients:
+                if len(groups) > 1 or len(clients) > 1:
+                    print(f"\n{client}: {name}")
+                # the user is asked about entries without task unless given by --no-tasks
+                client_built, client_skipped = generate_reports(
+                    data, client, config, classifier, template_paths[client], export_dir,
+                    workers=workers, manifest=manifest, force=args.force,
+                    no_tasks_handler=partial(handle_no_tasks, export=export_no_tasks),
+                    log_file=log_file, log_level=log_level, check=False,
+                    compression_level=compression_level, save_queue=output_config.get("save_queue", 2),
+                    cube=cube)
+                built += client_built
+                skipped += client_skipped
+            if not args.no_summary:
+                summary_path = os.path.join(export_dir, f"summary_{folder}.xlsx")
+                write_summary_workbook(cube, summary_path, compression_level)
+                print(f"\nWrote the summary of all clients to '{os.path.relpath(summary_path, cwd)}'.")
+        if dry_run:
+            print_plan(plan)
+            if args.dry_run:
+                write_plan(plan, os.path.abspath(args.dry_run))
+                print(f"\nWrote the plan to '{args.dry_run}'.")
+        log_stages()
+        log_timings()
+        # machine readable metrics of every run to compare runs and find regressions
+        write_metrics(os.path.join(os.path.dirname(log_file),
+                                   f"metrics_{time.strftime('%Y%m%d_%H%M%S')}.json"),
+                      clients=clients,
+                      exports=[os.path.basename(file) for file in files],
+                      workers=workers,
+                      rows=rows,
+                      workbooks=built,
+                      skipped=skipped,
+                      dry_run=dry_run,
+                      chunk_size=chunk_size,
+                      peak_memory_mb=peak_memory_mb(),
+                      seconds=time.perf_counter() - _start)
+
     except Exception as e:
         handle_unexpected_error(e)
 
     delta = round(time.time() - start, 3)
 
-    input(f"Finished Execution in {delta} s. Press any key to exit ...")
+    pause(f"Finished Execution in {delta} s. Press any key to exit ...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from utils.planning import get_project_names
+from utils.preprocessing import normalize_task_names
+from utils.utils import add_logging
+
+
+def unit_ids(units: list, n_rows: int) -> np.ndarray:
+    # work unit index of every row of the planned DataFrame, -1 if not planned
+    ids = np.full(n_rows, -1, dtype=np.intp)
+    for i, unit in enumerate(units):
+        ids[unit.rows] = i
+    return ids
+
+
+@add_logging
+def daily_table(data: pd.DataFrame, ids: np.ndarray, classifier) -> pd.DataFrame:
+    """
+    Aggregates the bookings per group (e.g. the ClientReport1 work unit, which is one
+    employee, project and month) and day in one vectorized pass.
+
+    Returns one row per group and day, sorted by group and day, with the integer
+    day key (see utils.dates.day_keys), the summed hours and the chosen comment.
+    If there are multiple bookings on the same day, the longest comment wins,
+    the later booking on a tie.
+    """
+    keep = ids >= 0
+    data, ids = data[keep], ids[keep]
+    n_rows = len(data)
+    if n_rows == 0:
+        return pd.DataFrame({"unit": np.array([], dtype=np.intp),
+                             "Entry Date": pd.Series([], dtype="datetime64[ns]"),
+                             "Day": np.array([], dtype=np.int64),
+                             "Hours": np.array([], dtype=float),
+                             "Comment": np.array([], dtype=object)})
+
+    days = data["Entry Date"].to_numpy().astype("datetime64[D]")
+    # np.lexsort is stable, so bookings of one day keep their order
+    order = np.lexsort((days, ids))
+    ids, days = ids[order], days[order]
+
+    changed = np.empty(n_rows, dtype=bool)
+    changed[0] = True
+    changed[1:] = (ids[1:] != ids[:-1]) | (days[1:] != days[:-1])
+    starts = np.flatnonzero(changed)
+    ends = np.append(starts[1:], n_rows)
+
+    # running sum over the bookings of every day, vectorized over the days:
+    # step k adds the k-th booking of all days with more than k bookings,
+    # which gives exactly the same floats as adding the bookings one by one
+    values = data["Hours"].to_numpy(dtype=float)[order]
+    hours = values[starts].copy()
+    n_bookings = ends - starts
+    for k in range(1, n_bookings.max()):
+        more = n_bookings > k
+        hours[more] += values[starts[more] + k]
+
+    # comments are classified once per distinct value
+    codes, uniques = pd.factorize(data["Comments"], use_na_sentinel=False)
+    comments = np.array([classifier.display(str(comment)) for comment in uniques], dtype=object)
+    lengths = np.array([len(comment) for comment in comments], dtype=np.intp)
+    codes = codes[order]
+
+    # sort by day, comment length and position, the last row of a day wins
+    segments = np.cumsum(changed) - 1
+    by_length = np.lexsort((np.arange(n_rows), lengths[codes], segments))
+    chosen = comments[codes[by_length[ends - 1]]]
+    # days where all comments are empty do not get a comment
+    chosen[lengths[codes[by_length[ends - 1]]] == 0] = None
+
+    table = pd.DataFrame({
+        "unit": ids[starts],
+        "Entry Date": days[starts].astype("datetime64[ns]"),
+        "Day": days[starts].astype(np.int64),
+        "Hours": hours,
+        "Comment": chosen
+    })
+    logging.info(f"Aggregated {n_rows} bookings to {len(table)} days.")
+    return table
+
+
+def unit_bounds(table: pd.DataFrame, n_units: int) -> np.ndarray:
+    # rows of unit i in the daily table are table.iloc[bounds[i]:bounds[i + 1]]
+    return np.searchsorted(table["unit"].to_numpy(), np.arange(n_units + 1))
+
+
+# dimensions of the hours cube, the month is split into year and month
+CUBE_KEYS = ["Client Name", "Project Code", "Task Name", "First Name", "Last Name", "Year", "Month"]
+
+
+@add_logging
+def hours_cube(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sums the hours by client, wbs code, task, employee and month in one groupby
+    over the whole export. The cube is computed once per export and shared by
+    the reports of all clients (see task_totals) and by the summary workbook.
+    Bookings without task are kept with a missing task name.
+    """
+    keys = [data[name] for name in CUBE_KEYS[:5]]
+    keys += [data["Entry Date"].dt.year.rename("Year"), data["Entry Date"].dt.month.rename("Month")]
+    cube = data["Hours"].groupby(keys, observed=True, dropna=False, sort=True).sum().reset_index()
+    cube = cube.dropna(subset=["Client Name", "Project Code", "Year"])
+    cube = cube.astype({"Year": int, "Month": int}).reset_index(drop=True)
+    # the names of the employees and projects are only built for the cells of the cube
+    cube["Employee"] = (cube["First Name"].astype(str).str.strip() + " "
+                        + cube["Last Name"].astype(str).str.strip())
+    cube["Project Name"] = cube["Project Code"].map(get_project_names(data)).astype(object)
+    logging.info(f"Aggregated {len(data)} bookings to a cube of {len(cube)} cells.")
+    return cube
+
+
+def task_totals(cube: pd.DataFrame, client_info: dict, long_task_name=True) -> dict:
+    # hours per normalized task of every (client name, wbs code), what fill_header
+    # of ClientReport2 writes to "Uebersicht"
+    tasks = normalize_task_names(cube["Task Name"], client_info, long_task_name)
+    totals = cube["Hours"].groupby([cube["Client Name"], cube["Project Code"], tasks],
+                                   observed=True, sort=False).sum()
+    result = {}
+    for (client_name, wbs, task), hours in totals.items():
+        result.setdefault((client_name, wbs), {})[task] = hours
+    return result
@@ -0,0 +1,91 @@
+import os
+import hashlib
+import logging
+
+import pandas as pd
+
+
+CACHE_SUFFIX = ".pkl"
+
+
+def file_hash(path, chunk_size=1024 * 1024) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ExportCache:
+    """
+    On-disk cache of prepared DataFrames.
+
+    Entries are keyed by the content hash of the Replicon Export plus a version
+    string (schema and relevant config), so a changed export or a changed
+    preprocessing never hits a stale entry. The DataFrames are stored as pickles,
+    which keeps the column blocks and dtypes (categoricals, datetimes) as they are.
+    The least recently used entries are evicted once the cache exceeds max_size_mb.
+    """
+
+    def __init__(self, cache_dir: str, max_size_mb: float = 500, enabled: bool = True):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size_mb * 1024**2
+        self.enabled = enabled
+
+    def key(self, file, version: str) -> str:
+        sha = hashlib.sha256(file_hash(file).encode())
+        sha.update(version.encode())
+        return sha.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def _entries(self) -> list:
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [entry for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and entry.name.endswith(CACHE_SUFFIX)]
+
+    def load(self, key: str):
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            logging.info("Export cache miss.")
+            return None
+        try:
+            df = pd.read_pickle(path)
+        except Exception as e:
+            logging.warning(f"Removed unreadable cache entry '{path}': {e}")
+            os.remove(path)
+            return None
+        # mark entry as recently used for the eviction
+        os.utime(path)
+        logging.info(f"Export cache hit: '{path}'.")
+        return df
+
+    def store(self, key: str, df: pd.DataFrame) -> None:
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        logging.info(f"Stored prepared DataFrame in export cache: '{path}'.")
+        self.evict()
+
+    def evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        size = sum(entry.stat().st_size for entry in entries)
+        # remove least recently used entries first
+        while entries and size > self.max_size:
+            entry = entries.pop(0)
+            size -= entry.stat().st_size
+            os.remove(entry.path)
+            logging.info(f"Evicted cache entry '{entry.path}'.")
+
+    def clear(self) -> None:
+        for entry in self._entries():
+            os.remove(entry.path)
+        logging.info(f"Cleared export cache in '{self.cache_dir}'.")
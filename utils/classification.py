@@ -0,0 +1,88 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# codes which can be mapped to an activity in the config
+ACTIVITY_CODES = ["000", "001", "002", "003", "004", "005", "006", "007", "999"]
+
+
+def get_code_to_activity(config: dict) -> dict:
+    return {code: config["Categories"].get(code) for code in ACTIVITY_CODES}
+
+
+def normalize_comment(raw_comment) -> str:
+    # someone wrote 1, 2, 5, etc. instead of 001, 002, 005
+    if isinstance(raw_comment, int):
+        return "00" + str(raw_comment)
+    elif pd.isna(raw_comment):
+        return "MISSING COMMENT"
+    return str(raw_comment)
+
+
+class ActivityClassifier:
+    """
+    Maps comments to activities with one compiled pattern.
+
+    code_to_activity should consists of a mapping from a code, e.g. "001", to
+    a specific activity, e.g. "Gematik-Abstimmung". If a comment contains several
+    codes, the code which comes first in code_to_activity wins.
+    additional_comments is a list of exceptions for the codes where the actual comment
+    should be used as well instead of just the activity corresponding to the code.
+    Results are memoized, most comments are repeated boilerplate.
+    """
+
+    def __init__(self, code_to_activity: dict, additional_comments: list):
+        self.code_to_activity = code_to_activity
+        self.additional_comments = additional_comments or []
+        self.rank = {code: i for i, code in enumerate(code_to_activity)}
+        # the lookahead finds overlapping occurrences, e.g. "000" and "001" in "0001"
+        alternatives = "|".join(re.escape(code) for code in code_to_activity)
+        self.pattern = re.compile(f"(?=({alternatives}))") if alternatives else None
+        self._cache = {}
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls(get_code_to_activity(config),
+                   config["Categories"].get("additional_comments_for_codes"))
+
+    def fingerprint(self) -> str:
+        return f"{self.code_to_activity} {self.additional_comments}"
+
+    def classify(self, comment: str) -> tuple:
+        # returns the code found in the comment (or None) and the comment to display
+        result = self._cache.get(comment)
+        if result is None:
+            code = None
+            if self.pattern is not None:
+                codes = self.pattern.findall(comment)
+                if codes:
+                    code = min(codes, key=self.rank.get)
+            display = comment
+            # only if the code is not in the additional comments list
+            # replace the comment by the activity
+            if code is not None and code not in self.additional_comments:
+                display = self.code_to_activity[code]
+            result = (code, display)
+            self._cache[comment] = result
+        return result
+
+    def display(self, comment: str) -> str:
+        return self.classify(comment)[1]
+
+    def classify_column(self, comments: pd.Series) -> tuple[pd.Series, pd.Series]:
+        """
+        Returns the activity and the display comment of every row, every distinct
+        comment is classified only once.
+        """
+        codes, uniques = pd.factorize(comments, use_na_sentinel=False)
+        activities, displays = [], []
+        for raw_comment in uniques:
+            code, display = self.classify(normalize_comment(raw_comment))
+            activities.append(self.code_to_activity[code] if code is not None else np.NaN)
+            displays.append(display)
+        activities = np.array(activities, dtype=object)[codes]
+        displays = np.array(displays, dtype=object)[codes]
+        return (pd.Series(activities, index=comments.index, dtype="category"),
+                pd.Series(displays, index=comments.index, dtype="category"))
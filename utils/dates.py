@@ -0,0 +1,50 @@
+import calendar
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+GERMAN_DATE_FORMAT = "%d.%m.%Y"
+
+
+def day_keys(dates) -> np.ndarray:
+    # integer key of every date, the days since 1970-01-01
+    return np.asarray(dates, dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+
+
+class DateDimension:
+    """
+    All days of the months from first to last, computed once per run instead of
+    once per sheet. Every day has an integer key (see day_keys), its German date
+    string and the weekday label of the locale. The days of a month are
+    contiguous, so reports find a day by key - first key of the month.
+    """
+
+    def __init__(self, first: date, last: date):
+        start = np.datetime64(first.replace(day=1), "D")
+        end = np.datetime64(last.replace(day=calendar.monthrange(last.year, last.month)[1]), "D")
+        days = np.arange(start, end + 1)
+        self.keys = days.astype(np.int64)
+        self.labels = pd.DatetimeIndex(days).strftime(GERMAN_DATE_FORMAT).tolist()
+        # 1970-01-01 was a thursday, weekday 0 is monday like in calendar
+        weekday_names = calendar.weekheader(3).split()
+        self.weekdays = [weekday_names[weekday] for weekday in ((self.keys + 3) % 7).tolist()]
+
+    @classmethod
+    def from_dates(cls, dates: pd.Series) -> "DateDimension":
+        # covers the months of all dates, today's month if there are none
+        dates = dates.dropna()
+        if dates.empty:
+            today = date.today()
+            return cls(today, today)
+        return cls(dates.min().date(), dates.max().date())
+
+    def covers(self, year: int, month: int) -> bool:
+        first = np.datetime64(date(year, month, 1), "D").astype(np.int64)
+        return self.keys[0] <= first <= self.keys[-1]
+
+    def month(self, year: int, month: int) -> slice:
+        # positions of the days of the month
+        first = int(np.datetime64(date(year, month, 1), "D").astype(np.int64) - self.keys[0])
+        return slice(first, first + calendar.monthrange(year, month)[1])
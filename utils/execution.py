@@ -0,0 +1,230 @@
+import os
+import csv
+import json
+import time
+import locale
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from utils.file_handling import create_folder, load_template, clone_template
+from utils.planning import plan_reports
+from utils.report import report_class
+from utils.style import get_template_dimensions, TemplateStamp
+from utils.saving import save_workbook, BackgroundSaver
+import utils.utils
+from utils.utils import pause, timings, merge_timings
+from utils.metrics import span, stages, merge_stages
+
+
+# templates are loaded once per process
+_templates = {}
+
+
+def get_template(path, client, config):
+    # returns the compiled template stamp, None if the client skips styling
+    if path not in _templates:
+        _, template_sheet, skip_style = load_template(path, client, config)
+        stamp = None
+        if not skip_style:
+            client_info = config.get("Clients").get(client)
+            dimensions = get_template_dimensions(template_sheet, client_info.get("max_range_rows"))
+            stamp = TemplateStamp(template_sheet, dimensions)
+        _templates[path] = stamp
+    return _templates[path]
+
+
+def create_jobs(data: pd.DataFrame, client: str, config: dict, classifier, template_path: str,
+                output_dir: str, cube: pd.DataFrame = None) -> list:
+    """
+    Plans the reports of the client and returns one job per output file.
+
+    cube is the hours_cube of data, computed here if not given.
+    """
+    client_info = config.get("Clients").get(client)
+    report = report_class(client_info)
+
+    # sort once by client, wbs code and the partition keys of the report
+    # and split the data into work units (target file, sheet, row range)
+    with span("plan", rows=len(data)) as counts:
+        planned, work_units = plan_reports(data, client, report)
+        counts["sheets"] = len(work_units)
+    # e.g. the daily table of all reports
+    context = report.prepare(data, planned, work_units, client_info, classifier, cube=cube)
+
+    # units writing to the same file are adjacent
+    jobs = {}
+    for i, unit in enumerate(work_units):
+        target_path = os.path.join(output_dir, unit.target)
+        if target_path not in jobs:
+            jobs[target_path] = {
+                "target_path": target_path,
+                "template_path": template_path,
+                "client": client,
+                "config": config,
+                "code_to_activity": classifier.code_to_activity,
+                "additional_comments": classifier.additional_comments,
+                "reports": [],
+                **report.job_fields(context)
+            }
+        group, info = report.unit_report(context, i, planned.iloc[unit.rows], unit.info, target_path)
+        jobs[target_path]["reports"].append((unit.sheet, group, info))
+    return list(jobs.values())
+
+
+def describe_jobs(jobs: list, output_dir: str, manifest=None) -> list:
+    """
+    Describes the output files of the jobs without writing anything, one record
+    per sheet, see Report.describe. With a manifest, files which would be
+    skipped as unchanged are marked.
+    """
+    unchanged = set()
+    if manifest is not None:
+        _, skipped = manifest.outdated(jobs)
+        unchanged = {job["target_path"] for job in skipped}
+    records = []
+    for job in jobs:
+        report = report_class(job["config"].get("Clients").get(job["client"]))
+        file = {"client": job["client"],
+                "file": os.path.relpath(job["target_path"], output_dir),
+                "status": "unchanged" if job["target_path"] in unchanged else "build"}
+        records += [{**file, **record} for record in report.describe(job)]
+    return records
+
+
+def write_plan(records: list, path: str) -> None:
+    # one row per sheet for .csv, JSON with the sheets grouped by file otherwise
+    if path.lower().endswith(".csv"):
+        fieldnames = list(dict.fromkeys(key for record in records for key in record))
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        files = {}
+        for record in records:
+            key = (record["client"], record["file"])
+            if key not in files:
+                files[key] = {"client": record["client"], "file": record["file"],
+                              "status": record["status"], "sheets": []}
+            files[key]["sheets"].append({key: value for key, value in record.items()
+                                         if key not in ("client", "file", "status")})
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"files": list(files.values())}, file, indent=2, ensure_ascii=False)
+    logging.info(f"Wrote plan of {len(records)} sheets to '{path}'.")
+
+
+def print_plan(records: list) -> None:
+    files = {}
+    for record in records:
+        files.setdefault((record["client"], record["file"], record["status"]), []).append(record)
+    for (client, file, status), sheets in files.items():
+        print(f"{file} ({client}, {status}): {len(sheets)} sheets, "
+              f"{sum(sheet['rows'] for sheet in sheets)} rows, "
+              f"{round(sum(sheet['hours'] for sheet in sheets), 2)} hours")
+        for sheet in sheets:
+            print(f"    {sheet['sheet']}: {sheet['rows']} rows, {round(sheet['hours'], 2)} hours")
+
+
+def init_worker(log_file, log_level, locale_name):
+    # worker processes do not inherit the logging and locale setup on every platform
+    logging.basicConfig(level=log_level, format="%(asctime)s [%(levelname)s] %(message)s",
+                        filename=log_file, force=True)
+    locale.setlocale(locale.LC_ALL, locale_name)
+    # a worker cannot prompt, errors are printed and the main process waits for the user
+    utils.utils.interactive = False
+
+
+@contextmanager
+def worker_errors(pool: ProcessPoolExecutor):
+    # the remaining tasks of the pool are cancelled after an error
+    try:
+        yield
+    except SystemExit:
+        # the worker already printed why it stopped
+        pool.shutdown(cancel_futures=True)
+        pause("Press any key to exit ...")
+        raise
+    except BaseException:
+        pool.shutdown(cancel_futures=True)
+        raise
+
+
+def fill_workbook(job: dict):
+    """
+    Fills one output workbook, see build_workbook for saving it.
+
+    A job only holds absolute paths and the rows of its reports, so it can run
+    in the main process as well as in a worker process.
+    """
+    config = job["config"]
+    client = job["client"]
+    client_info = config.get("Clients").get(client)
+
+    create_folder(os.path.dirname(job["target_path"]))
+    with span("template"):
+        output_excel = clone_template(job["template_path"])
+
+    # the report class of the client fills the workbook, see Report.build
+    stamp = get_template(job["template_path"], client, config)
+    return report_class(client_info).build(output_excel, job, stamp)
+
+
+def build_workbook(job: dict, compression_level: int = None) -> str:
+    # fills and saves one output workbook
+    save_workbook(fill_workbook(job), job["target_path"], compression_level)
+    return job["target_path"]
+
+
+def build_workbook_in_worker(job: dict, compression_level: int = None) -> tuple:
+    # the timings and stages of a worker process are sent back with every workbook
+    timings.clear()
+    stages.clear()
+    return build_workbook(job, compression_level), dict(timings), dict(stages)
+
+
+def job_rows(job: dict) -> int:
+    return sum(len(group) for _, group, _ in job["reports"])
+
+
+def print_progress(done_rows, total_rows, start):
+    # progress and estimated time left by the number of rows in the finished workbooks
+    share = done_rows / total_rows if total_rows else 1
+    elapsed = time.perf_counter() - start
+    eta = elapsed / share - elapsed if share else 0
+    print(f"Progress: {round(share * 100, 2)} % ({done_rows}/{total_rows} rows), "
+          f"ETA {round(eta, 1)} s   ", end="\r")
+
+
+def run_jobs(jobs: list, workers: int = 1, log_file=None, log_level="INFO", compression_level: int = None,
+             save_queue: int = 2) -> None:
+    """
+    Builds the workbooks of all jobs, spread across a process pool for more
+    than one worker. In the main process the workbooks are saved by a
+    BackgroundSaver, which holds at most save_queue filled workbooks.
+    """
+    total_rows = sum(job_rows(job) for job in jobs)
+    done_rows = 0
+    start = time.perf_counter()
+    if workers == 1 or len(jobs) <= 1:
+        with BackgroundSaver(save_queue, compression_level) as saver:
+            for job in jobs:
+                saver.submit(fill_workbook(job), job["target_path"])
+                done_rows += job_rows(job)
+                print_progress(done_rows, total_rows, start)
+        return
+
+    initargs = (log_file, log_level, locale.setlocale(locale.LC_ALL))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=initargs) as pool:
+        futures = {pool.submit(build_workbook_in_worker, job, compression_level): job for job in jobs}
+        with worker_errors(pool):
+            for future in as_completed(futures):
+                # re-raises errors of the worker process
+                _, worker_timings, worker_stages = future.result()
+                merge_timings(worker_timings)
+                merge_stages(worker_stages)
+                done_rows += job_rows(futures[future])
+                print_progress(done_rows, total_rows, start)
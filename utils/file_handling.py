@@ -1,52 +1,141 @@
 import os
 import sys
 import yaml
+import pickle
+import hashlib
 import logging
 
 import openpyxl
+from openpyxl.worksheet.table import TableList
 
-from utils.utils import add_logging
+from utils.utils import add_logging, pause
+from utils.validation import validate_config, rules_hash
 
 
-def create_folder(name, path=None):
+# path should be an absolute path, the working directory is never changed
+def create_folder(path):
     try:
-        os.mkdir(name)
-        logging.info(f"Created new folder {name}.")
+        os.makedirs(path)
+        logging.info(f"Created new folder {path}.")
     except FileExistsError:
-        logging.info(f"Skipped folder creation of folder '{name}' since it already exists.")
-        pass
-    # change back to working directory
-    if path is not None:
-        os.chdir(path)
-        logging.info(f"Changed directory to: '{path}'.")
-    else:
-        os.chdir(name)
-        logging.info(f"Changed directory to: '{name}'.")
+        logging.info(f"Skipped folder creation of folder '{path}' since it already exists.")
+
+# parsed templates are kept as pickled workbooks, unpickling is much cheaper
+# than copying and parsing the xlsx file again for every output file
+_template_buffers = {}
+
+
+def clone_template(path):
+    # returns a new in-memory copy of the template, the file is parsed once per process
+    buffer = _template_buffers.get(path)
+    if buffer is None:
+        workbook = openpyxl.load_workbook(path)
+        # the items of a TableList are (name, range) pairs, pickle would keep only the
+        # ranges, so the tables of every sheet are pickled next to the workbook
+        tables = [list(dict.items(sheet.tables)) for sheet in workbook.worksheets]
+        buffer = pickle.dumps((workbook, tables), protocol=pickle.HIGHEST_PROTOCOL)
+        _template_buffers[path] = buffer
+        logging.info(f"Cached template '{path}' in memory ({len(buffer)} bytes).")
+    template, tables = pickle.loads(buffer)
+    for sheet, sheet_tables in zip(template.worksheets, tables):
+        # pickle only restores the items of the dimension holders (defaultdicts),
+        # their worksheet and default factory have to be bound again
+        for dimensions, factory in ((sheet.row_dimensions, sheet._add_row),
+                                    (sheet.column_dimensions, sheet._add_column)):
+            dimensions.worksheet = sheet
+            dimensions.default_factory = factory
+        sheet._tables = TableList(sheet_tables)
+    return template
+
 
 # path should be os pathlike object
 @add_logging
 def load_template(path, client, config):
     try:
-        template = openpyxl.load_workbook(path)
+        template = clone_template(path)
         skip_style = config.get("Clients").get(client).get("skip_style")
         if not skip_style:
-            template_sheet = template[config.get("Clients").get(client).get("template_sheet_name")]
+            sheet_name = config.get("Clients").get(client).get("template_sheet_name")
+            if sheet_name not in template.sheetnames:
+                print(f"[ERROR] The template '{path}' has no sheet '{sheet_name}', see 'template_sheet_name' in the config.")
+                pause("Aborting. Press any key to exit ...")
+                sys.exit(1)
+            template_sheet = template[sheet_name]
         else:
             template_sheet = None
         return template, template_sheet, skip_style
     except FileNotFoundError:
         print("[ERROR] No template file found. Please provide a template file for your 'Leistungsnachweis'.")
         print("Please create a folder 'Template' with a 'template.xlsx' file inside.")
-        input("Aborting. Press any key to exit ...")
-        sys.exit()
+        pause("Aborting. Press any key to exit ...")
+        sys.exit(1)
+
+# the C loader is much faster, but only available if PyYAML was built with libyaml
+ConfigLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+# bump if the format of the cached config changes, changes of the validation
+# rules are covered by rules_hash
+CONFIG_CACHE_VERSION = "1"
+
+
+def _config_cache_path(path, content: bytes) -> str:
+    # compiled configs are kept next to the config, like python's own bytecode
+    sha = hashlib.sha256(content)
+    sha.update(CONFIG_CACHE_VERSION.encode())
+    sha.update(rules_hash().encode())
+    return os.path.join(os.path.dirname(path), "__pycache__", f"config.{sha.hexdigest()[:16]}.pickle")
+
 
 @add_logging
 def load_config(path):
+    """
+    Returns the validated config. The validated config is cached as a pickle
+    keyed by the content of the file and the validation rules, so it is only
+    parsed and validated again after a change of either.
+    """
     try:
-        with open(path, "r", encoding="utf-8") as ymlfile:
-            config = yaml.load(ymlfile, Loader=yaml.SafeLoader)
-        return config
+        with open(path, "rb") as ymlfile:
+            content = ymlfile.read()
     except FileNotFoundError:
         print("[ERROR] Missing config file in template folder.")
-        input("Aborting. Press any key to exit ...")
-        sys.exit()
+        pause("Aborting. Press any key to exit ...")
+        sys.exit(1)
+
+    cache_path = _config_cache_path(path, content)
+    try:
+        with open(cache_path, "rb") as cache_file:
+            return pickle.load(cache_file)
+    except (OSError, pickle.PickleError, EOFError, AttributeError):
+        pass
+
+    try:
+        config = yaml.load(content.decode("utf-8"), Loader=ConfigLoader)
+    except yaml.YAMLError as e:
+        problems = [f"The config file is no valid YAML: {e}"]
+    else:
+        problems = validate_config(config)
+    if problems:
+        handle_invalid_config(problems, path)
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path + ".tmp", "wb") as cache_file:
+            pickle.dump(config, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_path + ".tmp", cache_path)
+        # older versions of the config are not needed anymore
+        for entry in os.scandir(os.path.dirname(cache_path)):
+            if entry.name.startswith("config.") and entry.name.endswith(".pickle") \
+                    and entry.path != cache_path:
+                os.remove(entry.path)
+    except OSError as e:
+        # e.g. a read-only template folder, the config is parsed on every run then
+        logging.warning(f"Could not cache the config in '{cache_path}': {e}")
+    return config
+
+
+def handle_invalid_config(problems: list, path) -> None:
+    logging.info(f"Invalid config '{path}': {problems}")
+    print(f"[ERROR] The config file '{path}' is invalid:")
+    for problem in problems:
+        print(f"  - {problem}")
+    pause("Please fix the config file and re-run the program. Press any key to exit ...")
+    sys.exit(1)
@@ -0,0 +1,144 @@
+import time
+import logging
+
+import openpyxl
+import numpy as np
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+from utils.validation import validate_header
+
+
+# strings pd.read_excel treats as missing values
+NA_STRINGS = frozenset(STR_NA_VALUES)
+
+
+def _convert_value(value):
+    # mirror the cell conversion of pd.read_excel, e.g. 8.0 becomes 8
+    if value.__class__ is float and value.is_integer():
+        return int(value)
+    if value.__class__ is str and value in NA_STRINGS:
+        return np.NaN
+    return value
+
+
+def open_export(file):
+    """
+    Opens the Replicon Export and returns the workbook, the header row and an
+    iterator over the data rows. The header row is validated before any data
+    row is read (raises TypeError for unexpected column names), the workbook
+    is closed then. Otherwise the caller has to close it.
+    """
+    export_wb = openpyxl.load_workbook(file, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = export_wb.active
+        # the dimensions stored in the file are not reliable
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+
+        header = list(next(rows, None) or [])
+        while header and header[-1] is None:
+            header.pop()
+        validate_header(header)
+    except BaseException:
+        export_wb.close()
+        raise
+    return export_wb, header, rows
+
+
+def log_read(file, n_rows: int, start: float) -> None:
+    delta = time.perf_counter() - start
+    rate = round(n_rows / delta) if delta > 0 else n_rows
+    logging.info(f"Read {n_rows} rows from '{file}' in {round(delta, 3)} s ({rate} rows/s).")
+    print(f"Read {n_rows} rows from Replicon Export in {round(delta, 3)} s ({rate} rows/s).")
+
+
+def read_export(file) -> pd.DataFrame:
+    """
+    Reads the Replicon Export in a single streaming pass.
+
+    The header row is validated before any data row is read, see open_export,
+    the data rows are collected column by column and the footer row (the last
+    non-empty row) is skipped.
+    """
+    start = time.perf_counter()
+    export_wb, header, rows = open_export(file)
+    try:
+        width = len(header)
+        columns = [[] for _ in range(width)]
+        n_rows = 0
+        last_row_with_data = -1
+        for row in rows:
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            has_data = False
+            for values, value in zip(columns, row):
+                if value is None:
+                    values.append(np.NaN)
+                    continue
+                value = _convert_value(value)
+                has_data = has_data or value is not np.NaN
+                values.append(value)
+            if has_data:
+                last_row_with_data = n_rows
+            n_rows += 1
+    finally:
+        export_wb.close()
+
+    # trim trailing empty rows, then skip the footer row
+    n_rows = max(last_row_with_data, 0)
+    for values in columns:
+        del values[n_rows:]
+    df = pd.DataFrame(dict(zip(header, columns)))
+    log_read(file, n_rows, start)
+    return df
+
+
+def _has_data(row) -> bool:
+    return any(value is not None and not (value.__class__ is str and value in NA_STRINGS)
+               for value in row)
+
+
+def read_export_chunks(file, chunk_size: int = 50000, usecols=None):
+    """
+    Streams the Replicon Export as DataFrames of up to chunk_size rows, for
+    exports which should not be held in memory as a whole.
+
+    The header row is validated right away, not when the first chunk is
+    requested, see open_export. Only the columns in usecols (all if None) are
+    kept. Empty rows are dropped, the index is the position of the row in the
+    export like for read_export. The footer row (the last non-empty row) is
+    held back until the next row with data arrives, so it is never part of a
+    chunk.
+    """
+    start = time.perf_counter()
+    export_wb, header, rows = open_export(file)
+    return _stream_chunks(file, export_wb, header, rows, chunk_size, usecols, start)
+
+
+def _stream_chunks(file, export_wb, header, rows, chunk_size, usecols, start):
+    n_rows = 0
+    try:
+        keep = [i for i, name in enumerate(header) if usecols is None or name in usecols]
+        names = [header[i] for i in keep]
+
+        chunk, index = [], []
+        pending = None
+        for position, row in enumerate(rows):
+            if not _has_data(row):
+                continue
+            if pending is not None:
+                index.append(pending[0])
+                chunk.append(pending[1])
+                if len(chunk) >= chunk_size:
+                    n_rows += len(chunk)
+                    yield pd.DataFrame(dict(zip(names, zip(*chunk))), index=index)
+                    chunk, index = [], []
+            pending = (position, [np.NaN if i >= len(row) or row[i] is None else _convert_value(row[i])
+                                  for i in keep])
+        if chunk:
+            n_rows += len(chunk)
+            yield pd.DataFrame(dict(zip(names, zip(*chunk))), index=index)
+    finally:
+        export_wb.close()
+    log_read(file, n_rows, start)
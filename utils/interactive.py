@@ -5,7 +5,7 @@ import logging
 import openpyxl
 import pandas as pd
 
-from utils.utils import add_logging
+from utils.utils import add_logging, pause
 
 
 column_names = [
@@ -15,6 +15,18 @@ column_names = [
         "Work Type (CHE)", "Work Location", "Time Entry Approval Status", "Timesheet Approval Status"
     ]
 
+@add_logging
+def get_all_inputs(cwd):
+    # all Replicon Exports in the current directory, to load them together
+    files = sorted(fname for fname in os.listdir(cwd) if "Timesheet Hours" in fname)
+    if not files:
+        logging.warning("No Replicon Export provided. Script terminates.")
+        pause("No Replicon Export found. Press any key to exit ...")
+        sys.exit(1)
+    logging.info(f"Selected {len(files)} input files.")
+    return files
+
+
 @add_logging
 def get_input(cwd):
     dirs = os.listdir(cwd)
@@ -56,8 +68,8 @@ def get_input(cwd):
     # if none, exit
     else:
         logging.warning("No Replicon Export provided. Script terminates.")
-        input("No Replicon Export found. Press any key to exit ...")
-        sys.exit()
+        pause("No Replicon Export found. Press any key to exit ...")
+        sys.exit(1)
 
     logging.info("Successfully selected input file.")
     return file
@@ -73,10 +85,10 @@ def handle_failed_input():
         column_names_ws.cell(row=1, column=col).value = name
     column_names_wb.save("column_names.xlsx")
     print("There should be a file named 'column_names.xlsx' with the correct column names.")
-    input("Please change your column names (you can copy and paste them) and re-run the program.\n"\
+    pause("Please change your column names (you can copy and paste them) and re-run the program.\n"\
           + "Press any key to exit ...")
     logging.warning("Script terminates. But correct column names were given to the user.")
-    sys.exit()
+    sys.exit(1)
 
 
 @add_logging
@@ -102,29 +114,42 @@ def select_client(config: dict):
             break
     else:
         logging.warning("User entered three invald inputs. Script terminates.")
-        input("Received three invalid inputs. Script termintates. Please press any key ...")
-        sys.exit()
+        pause("Received three invalid inputs. Script termintates. Please press any key ...")
+        sys.exit(1)
 
     client_info = config.get("Clients").get(client)
     logging.info("Successfully selected client.")
     return client, client_info
 
 
+def export_no_tasks(no_tasks: pd.DataFrame, output_dir: str = ".") -> None:
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    # add header, the columns of the export kept by preprocessing in their original order
+    columns = [name for name in column_names if name in no_tasks.columns]
+    ws.append(columns)
+    rows = no_tasks[columns].astype(object)
+    for row in rows.where(rows.notna(), None).itertuples(index=False):
+        ws.append(list(row))
+    wb.save(os.path.join(output_dir, "no_tasks.xlsx"))
+
+
 @add_logging
-def handle_no_tasks(no_tasks: pd.DataFrame) -> None:
+def handle_no_tasks(no_tasks: pd.DataFrame, output_dir: str = ".", export: bool = None) -> None:
+    # export decides without asking the user, e.g. in batch runs
     print(f"Found {len(no_tasks)} entries without any task name.")
     print("Note, that these entries won't be included in the 'Stundenaufstellung'.")
+    if export is not None:
+        if export:
+            export_no_tasks(no_tasks, output_dir)
+            print(f"New file created: '{os.path.join(output_dir, 'no_tasks.xlsx')}'")
+        logging.info(f"Handled no task entries without asking, export: {export}.")
+        return
     for _ in range(3):
         export = input("Would you like to export them in a separate excel file? (y/n) ")
         logging.info(f"User's choice in 'handle_no_tasks' function: {export}")
         if export == "y":
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            # add header
-            ws.append(column_names)
-            for _, row in no_tasks.iterrows():
-                ws.append(row.tolist())
-            wb.save("no_tasks.xlsx")
+            export_no_tasks(no_tasks, output_dir)
             print("\nNew file created: 'no_tasks.xlsx'")
             print("However, I recommend adding tasks to your original Replicon Export.")
             print("Then, you can re-run the program to include all entries.")
@@ -137,8 +162,52 @@ def handle_no_tasks(no_tasks: pd.DataFrame) -> None:
             print(f"'{export}' is not a valid input. Please select 'y' for 'yes' and 'n' for 'no'.")
     else:
         logging.warning("User entered three invald inputs. Script terminates.")
-        input("Received three invalid inputs. Script termintates. Please press any key ...")
-        sys.exit()
+        pause("Received three invalid inputs. Script termintates. Please press any key ...")
+        sys.exit(1)
+
+
+@add_logging
+def get_clients(config: dict, names: list) -> list:
+    # clients given on the command line, "all" selects every client of the config
+    clients = list(config.get("Clients").keys())
+    if names != ["all"]:
+        unknown = [name for name in names if name not in clients]
+        if unknown:
+            logging.warning(f"Unknown clients given: {unknown}")
+            print(f"[ERROR] Unknown clients: {', '.join(unknown)}. Clients in config file: {', '.join(clients)}")
+            pause("Aborting. Press any key to exit ...")
+            sys.exit(1)
+        clients = names
+    # several clients share one export, every client needs to know its rows
+    unmapped = [client for client in clients if not config.get("Clients").get(client).get("client_names")]
+    if len(clients) > 1 and unmapped:
+        logging.warning(f"Clients without 'client_names': {unmapped}")
+        print(f"[ERROR] Several clients need 'client_names' (their values of 'Client Name' in the "
+              f"Replicon Export) in the config, missing for: {', '.join(unmapped)}")
+        pause("Aborting. Press any key to exit ...")
+        sys.exit(1)
+    return clients
+
+
+def handle_failed_preflight(problems: list, client: str) -> None:
+    logging.warning(f"Preflight check for '{client}' failed: {problems}")
+    print(f"[ERROR] The reports for '{client}' cannot be created:")
+    for problem in problems:
+        print(f"  - {problem}")
+    print("No output file was written. Please fix the config, the template or the Replicon Export.")
+    pause("Aborting. Press any key to exit ...")
+    sys.exit(1)
+
+
+def handle_empty_export(client_names: list = None) -> None:
+    logging.error(f"created DataFrame is empty, client names: {client_names}")
+    if client_names is not None:
+        print(f"[ERROR] No entry of the Replicon Export belongs to the client names {client_names}.")
+        print("Please check 'client_names' in the config.")
+    else:
+        print("[ERROR] The Replicon Export contains no entry with a client name.")
+    pause("Aborting. Press any key to exit ...")
+    sys.exit(1)
 
 
 def handle_unexpected_error(error):
@@ -146,5 +215,5 @@ def handle_unexpected_error(error):
     logging.error(f"{error}")
     print("[ERROR] Something unexpected happened.")
     print("[ERROR] Please, contact the developers and send them the log file.")
-    input("[ERROR] Script terminates. Press any key to exit ...")
-    sys.exit()
+    pause("[ERROR] Script terminates. Press any key to exit ...")
+    sys.exit(1)
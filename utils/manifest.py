@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+import logging
+
+import pandas as pd
+
+from utils.cache import file_hash
+
+
+MANIFEST_NAME = "manifest.json"
+# bump if the reports change, so all workbooks are rebuilt once
+MANIFEST_VERSION = "1"
+
+
+def config_hash(config: dict, client: str) -> str:
+    # only the parts of the config which end up in the reports of the client
+    relevant = {"client": config.get("Clients").get(client),
+                "Categories": config.get("Categories"),
+                "Grades": config.get("Grades")}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class OutputManifest:
+    """
+    Records the inputs of every generated workbook in output_dir/manifest.json.
+
+    The fingerprint of a job is the content hash of the rows of its reports,
+    the sheet names and report infos plus the hashes of the template and the
+    config. A workbook is only rebuilt if its fingerprint changed or the file
+    is missing, e.g. a corrected day only rebuilds the month file it belongs to.
+    """
+
+    def __init__(self, output_dir: str):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.output_dir = output_dir
+        self.entries = {}
+        self._template_hashes = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignored unreadable manifest '{self.path}': {e}")
+
+    def _key(self, job: dict) -> str:
+        return os.path.relpath(job["target_path"], self.output_dir)
+
+    def fingerprint(self, job: dict) -> str:
+        template_path = job["template_path"]
+        if template_path not in self._template_hashes:
+            self._template_hashes[template_path] = file_hash(template_path)
+        sha = hashlib.sha256(MANIFEST_VERSION.encode())
+        sha.update(self._template_hashes[template_path].encode())
+        sha.update(config_hash(job["config"], job["client"]).encode())
+        for sheet, group, info in job["reports"]:
+            sha.update(repr(sheet).encode())
+            # tables of the info (e.g. the entries without task) are hashed by content
+            sha.update(repr({key: value for key, value in info.items()
+                             if not isinstance(value, pd.DataFrame)}).encode())
+            for table in [group] + [value for value in info.values() if isinstance(value, pd.DataFrame)]:
+                sha.update(pd.util.hash_pandas_object(table, index=False).to_numpy().tobytes())
+        return sha.hexdigest()
+
+    def outdated(self, jobs: list) -> tuple[list, list]:
+        # splits the jobs into the ones to build and the ones with an unchanged workbook
+        build, skipped = [], []
+        for job in jobs:
+            job["fingerprint"] = self.fingerprint(job)
+            if (self.entries.get(self._key(job)) == job["fingerprint"]
+                    and os.path.exists(job["target_path"])):
+                skipped.append(job)
+            else:
+                build.append(job)
+        logging.info(f"{len(build)} workbooks to build, {len(skipped)} unchanged.")
+        return build, skipped
+
+    def update(self, jobs: list) -> None:
+        for job in jobs:
+            self.entries[self._key(job)] = job.get("fingerprint") or self.fingerprint(job)
+
+    def save(self) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        logging.info(f"Saved output manifest '{self.path}'.")
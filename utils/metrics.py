@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import logging
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+from utils.utils import timings
+
+
+# stages of the run in this process:
+# stage name -> {"calls": ..., "seconds": ..., and counts like "rows", "sheets", "cells", "bytes"}
+stages = {}
+
+
+def peak_memory_mb():
+    # peak resident memory of the process, None where it cannot be measured
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def memory_mb():
+    # current resident memory of the process, the peak where only that is known
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024**2, 1)
+    except (OSError, ValueError, AttributeError):
+        return peak_memory_mb()
+
+
+def add_span(name: str, seconds: float, counts: dict) -> None:
+    stage = stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+    stage["calls"] += 1
+    stage["seconds"] += seconds
+    for key, value in counts.items():
+        stage[key] = stage.get(key, 0) + value
+
+
+@contextmanager
+def span(name: str, **counts):
+    """
+    Times the stage name, the counts are added to the stage. The yielded dict
+    can be used to add counts which are only known after the work, e.g. the
+    number of bytes saved.
+    """
+    start = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        add_span(name, time.perf_counter() - start, counts)
+
+
+def merge_stages(other: dict) -> None:
+    # adds the stages of another process, e.g. a worker of the process pool
+    for name, stage in other.items():
+        target = stages.setdefault(name, {"calls": 0, "seconds": 0.0})
+        for key, value in stage.items():
+            target[key] = target.get(key, 0) + value
+
+
+def log_stages() -> None:
+    logging.info("Time spent in stages:")
+    for name, stage in stages.items():
+        counts = ", ".join(f"{value} {key}" for key, value in stage.items()
+                           if key not in ("calls", "seconds"))
+        logging.info(f"  {name}: {stage['calls']} calls, {round(stage['seconds'], 3)} s"
+                     + (f", {counts}" if counts else ""))
+
+
+def write_metrics(path: str, **run_info) -> None:
+    """
+    Writes the stages and the timings of the decorated functions of the run as
+    JSON, run_info holds the details of the run, e.g. client and total seconds.
+    """
+    metrics = {**run_info, "stages": {}, "functions": {}}
+    for name, stage in stages.items():
+        metrics["stages"][name] = dict(stage)
+        if stage.get("rows") and stage["seconds"] > 0:
+            metrics["stages"][name]["rows_per_second"] = round(stage["rows"] / stage["seconds"], 1)
+    for name, (calls, total, longest) in timings.items():
+        metrics["functions"][name] = {"calls": calls, "seconds": total, "max_seconds": longest}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(metrics, file, indent=2, default=str)
+    logging.info(f"Wrote run metrics to '{path}'.")
@@ -0,0 +1,225 @@
+"""
+The stages of a run without any prompt, to use the script as a library:
+
+    config = load_config("Template/config.yaml")
+    classifier = ActivityClassifier.from_config(config)
+    data = load_export("Timesheet Hours.xlsx", classifier=classifier)
+    generate_reports(data, "Client", config, classifier,
+                     "Template/template_Client.xlsx", "output")
+"""
+import os
+import locale
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utils.aggregation import hours_cube
+from utils.cache import ExportCache
+from utils.classification import ActivityClassifier
+from utils.execution import get_template, create_jobs, run_jobs, describe_jobs, init_worker, \
+    worker_errors
+from utils.file_handling import create_folder, load_config, clone_template
+from utils.ingestion import read_export, read_export_chunks
+from utils.interactive import handle_failed_input, handle_failed_preflight
+from utils.manifest import OutputManifest
+from utils.metrics import span, stages, merge_stages
+from utils.preprocessing import prepare_df, prepare_chunks, merge_exports, SCHEMA_VERSION, EXPORT_SCHEMA
+from utils.summary import write_summary
+from utils.utils import timings, merge_timings
+from utils.validation import preflight
+
+
+__all__ = ["load_config", "load_export", "load_exports", "summarize_export", "check_reports",
+           "generate_reports", "describe_reports", "write_summary_workbook", "ActivityClassifier",
+           "ExportCache"]
+
+# rows per chunk if only a memory ceiling is given, it is checked after every chunk
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def load_export(file: str, cache: ExportCache = None, classifier: ActivityClassifier = None,
+                chunk_size: int = None, client_names: list = None, max_memory_mb: float = None) -> pd.DataFrame:
+    """
+    Returns the prepared DataFrame of the Replicon Export, cached on disk if a
+    cache is given. client_names keeps only the rows of these values of "Client
+    Name". With a chunk_size the export is read and prepared chunk by chunk, so
+    only the kept rows are held in memory, see prepare_chunks. A max_memory_mb
+    without a chunk_size reads chunks of DEFAULT_CHUNK_SIZE rows, the ceiling is
+    only checked between chunks.
+    """
+    if client_names is not None:
+        client_names = sorted(set(client_names), key=str)
+    cache_key = None
+    if cache is not None:
+        fingerprint = classifier.fingerprint() if classifier is not None else ""
+        cache_key = cache.key(file, f"{SCHEMA_VERSION} {EXPORT_SCHEMA} {fingerprint} {client_names}")
+        with span("cache") as counts:
+            data = cache.load(cache_key)
+            counts["hits"] = int(data is not None)
+        if data is not None:
+            return data
+
+    if max_memory_mb and not chunk_size:
+        chunk_size = DEFAULT_CHUNK_SIZE
+    if chunk_size:
+        # reading and preprocessing are interleaved, both are one stage
+        with span("ingest", bytes=os.path.getsize(file)) as counts:
+            try:
+                data = prepare_chunks(read_export_chunks(file, chunk_size, usecols=EXPORT_SCHEMA),
+                                      classifier, client_names, max_memory_mb)
+            except TypeError:
+                logging.warning("User used non-german column names.")
+                handle_failed_input()
+            counts["rows"] = len(data)
+        if cache is not None:
+            cache.store(cache_key, data)
+        return data
+
+    # read the Replicon Export once, the header row is checked for english column names
+    with span("ingest", bytes=os.path.getsize(file)) as counts:
+        try:
+            data = read_export(file)
+        except TypeError:
+            logging.warning("User used non-german column names.")
+            handle_failed_input()
+        counts["rows"] = len(data)
+
+    # some preprocessing
+    with span("preprocess", rows=len(data)):
+        data = prepare_df(data, classifier, client_names)
+    if cache is not None:
+        cache.store(cache_key, data)
+    return data
+
+
+def load_export_in_worker(file: str, options: dict) -> tuple:
+    # the timings and stages of a worker process are sent back with the DataFrame
+    timings.clear()
+    stages.clear()
+    return load_export(file, **options), dict(timings), dict(stages)
+
+
+def load_exports(files: list, cache: ExportCache = None, classifier: ActivityClassifier = None,
+                 workers: int = 1, log_file: str = None, log_level: str = "INFO", **options) -> pd.DataFrame:
+    """
+    Loads several Replicon Exports as one DataFrame, e.g. one export per team or
+    per month. The exports are parsed in a process pool for more than one worker,
+    see load_export for the options. Bookings contained in several exports are
+    kept once, see merge_exports.
+    """
+    options = dict(options, cache=cache, classifier=classifier)
+    if workers == 1 or len(files) <= 1:
+        frames = [load_export(file, **options) for file in files]
+    else:
+        initargs = (log_file, log_level, locale.setlocale(locale.LC_ALL))
+        with ProcessPoolExecutor(max_workers=min(workers, len(files)), initializer=init_worker,
+                                 initargs=initargs) as pool:
+            futures = [pool.submit(load_export_in_worker, file, options) for file in files]
+            frames = []
+            with worker_errors(pool):
+                for future in futures:
+                    # re-raises errors of the worker process
+                    data, worker_timings, worker_stages = future.result()
+                    merge_timings(worker_timings)
+                    merge_stages(worker_stages)
+                    frames.append(data)
+    if len(frames) == 1:
+        return frames[0]
+    with span("merge", rows=sum(len(data) for data in frames)) as counts:
+        data = merge_exports(frames)
+        counts["duplicates"] = counts["rows"] - len(data)
+    return data
+
+
+def summarize_export(data: pd.DataFrame) -> pd.DataFrame:
+    # the hours by client, wbs code, task, employee and month, see hours_cube
+    with span("cube", rows=len(data)) as counts:
+        cube = hours_cube(data)
+        counts["cells"] = len(cube)
+    return cube
+
+
+def write_summary_workbook(cube: pd.DataFrame, path: str, compression_level: int = None) -> None:
+    with span("summary", cells=len(cube)):
+        write_summary(cube, path, compression_level)
+
+
+def client_data(data: pd.DataFrame, client: str, config: dict) -> pd.DataFrame:
+    # only the rows of the values of "Client Name" the client lists in 'client_names', if any
+    client_names = config.get("Clients").get(client).get("client_names")
+    if not client_names:
+        return data
+    return data[data["Client Name"].isin(client_names)]
+
+
+def check_reports(data: pd.DataFrame, client: str, config: dict, template_path: str) -> None:
+    # fails before any workbook is written if the data does not fit the config or the template
+    data = client_data(data, client, config)
+    with span("preflight", rows=len(data)):
+        problems = preflight(data, client, config, clone_template(template_path).sheetnames)
+    if problems:
+        handle_failed_preflight(problems, client)
+
+
+def generate_reports(data: pd.DataFrame, client: str, config: dict, classifier: ActivityClassifier,
+                     template_path: str, output_dir: str, workers: int = 1,
+                     manifest: OutputManifest = None, force: bool = False, no_tasks_handler=None,
+                     log_file: str = None, log_level: str = "INFO", check: bool = True,
+                     compression_level: int = None, save_queue: int = 2,
+                     cube: pd.DataFrame = None) -> tuple[int, int]:
+    """
+    Creates the reports of the client and returns the number of built and of
+    skipped output files. Only output files with changed inputs are rebuilt,
+    unless force is set, see OutputManifest. check runs check_reports first.
+    compression_level and save_queue are passed to run_jobs, cube is the
+    hours_cube of data to share it between clients. Only the rows of the
+    client are used, see client_data. no_tasks_handler is called with the
+    entries without task name and the output folder of every rebuilt report
+    which has them in its info, e.g. to ask the user to export them.
+    """
+    data = client_data(data, client, config)
+    if check:
+        check_reports(data, client, config, template_path)
+    with span("template"):
+        get_template(template_path, client, config)
+    create_folder(output_dir)
+    if manifest is None:
+        manifest = OutputManifest(output_dir)
+
+    # one job per output file
+    jobs = create_jobs(data, client, config, classifier, template_path, output_dir, cube=cube)
+    unchanged = []
+    if not force:
+        with span("manifest", workbooks=len(jobs)) as counts:
+            jobs, unchanged = manifest.outdated(jobs)
+            counts["skipped"] = len(unchanged)
+    if unchanged:
+        print(f"Skipped {len(unchanged)} unchanged output files, rebuilding {len(jobs)}.")
+        for job in unchanged:
+            logging.info(f"Skipped unchanged '{job['target_path']}'.")
+    # entries without task are handled before the jobs are distributed,
+    # only for the output files which are rebuilt
+    if no_tasks_handler is not None:
+        for job in jobs:
+            for _, _, info in job["reports"]:
+                if "no_tasks" in info:
+                    output_folder = os.path.dirname(job["target_path"])
+                    os.makedirs(output_folder, exist_ok=True)
+                    no_tasks_handler(info["no_tasks"], output_folder)
+    run_jobs(jobs, workers=workers, log_file=log_file, log_level=log_level,
+             compression_level=compression_level, save_queue=save_queue)
+    manifest.update(jobs)
+    manifest.save()
+    return len(jobs), len(unchanged)
+
+
+def describe_reports(data: pd.DataFrame, client: str, config: dict, classifier: ActivityClassifier,
+                     template_path: str, output_dir: str, manifest: OutputManifest = None,
+                     cube: pd.DataFrame = None) -> list:
+    # the plan of generate_reports without writing anything, see describe_jobs
+    data = client_data(data, client, config)
+    check_reports(data, client, config, template_path)
+    with span("describe"):
+        jobs = create_jobs(data, client, config, classifier, template_path, output_dir, cube=cube)
+        return describe_jobs(jobs, output_dir, manifest)
@@ -0,0 +1,97 @@
+import os
+import logging
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.preprocessing import clean_name
+from utils.utils import add_logging
+
+
+class WorkUnit(NamedTuple):
+    # output file relative to the output folder
+    target: str
+    # sheet in the output file, None if the unit covers the whole file
+    sheet: Optional[str]
+    # row range in the planned DataFrame
+    rows: slice
+    # report parameters, e.g. month, year and employee name
+    info: dict
+
+
+# partition keys which are parts of the entry date
+DATE_KEYS = {"Year": "year", "Month": "month"}
+
+
+def _key_column(key: str) -> str:
+    return "Entry Date" if key in DATE_KEYS else key
+
+
+def _key_codes(df: pd.DataFrame, keys: list) -> list:
+    """
+    Integer codes of the partition keys, in order of precedence.
+    Categorical codes follow the category order, i.e. the order groupby uses.
+    """
+    codes = []
+    for key in keys:
+        if key in DATE_KEYS:
+            codes.append(getattr(df["Entry Date"].dt, DATE_KEYS[key]).to_numpy())
+        else:
+            codes.append(df[key].cat.codes.to_numpy())
+    return codes
+
+
+def get_project_names(df: pd.DataFrame) -> dict:
+    # the first booking of a project code determines the project name
+    projects = df[["Project Code", "Project Name"]].drop_duplicates("Project Code")
+    return dict(zip(projects["Project Code"], projects["Project Name"]))
+
+
+@add_logging
+def plan_reports(data: pd.DataFrame, client: str, report) -> tuple[pd.DataFrame, list]:
+    """
+    Sorts the data once by the composite partition key (client, project code and
+    the partition keys of the report class, e.g. year, month and last name for
+    ClientReport1) and splits it into work units, see Report.layout.
+    Every unit refers to a contiguous row range of the returned DataFrame, so a
+    report gets its rows with planned.iloc[unit.rows] without any copy.
+    """
+    project_names = get_project_names(data)
+    keys = ["Client Name", "Project Code"] + report.partition_keys
+
+    # rows without a key would be dropped by groupby as well
+    valid = np.ones(len(data), dtype=bool)
+    for column in dict.fromkeys(_key_column(key) for key in keys):
+        valid &= data[column].notna().to_numpy()
+    data = data[valid]
+
+    codes = _key_codes(data, keys)
+    # np.lexsort is stable and sorts by the last key first
+    order = np.lexsort(codes[::-1])
+    planned = data.take(order).reset_index(drop=True)
+    codes = [key[order] for key in codes]
+
+    n_rows = len(planned)
+    changed = np.zeros(n_rows, dtype=bool)
+    if n_rows:
+        changed[0] = True
+        for key in codes:
+            changed[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(changed)
+    ends = np.append(starts[1:], n_rows)
+
+    client_names = planned["Client Name"].to_numpy()
+    wbs_codes = planned["Project Code"].to_numpy()
+    units = []
+    for start, end in zip(starts, ends):
+        client_name = client_names[start]
+        wbs = wbs_codes[start]
+        project_name = clean_name(project_names[wbs])
+        wbs_folder = os.path.join(str(client_name), f"{wbs} ({project_name})")
+
+        target, sheet, info = report.layout(client, wbs_folder, project_name, planned, start)
+        units.append(WorkUnit(target=target, sheet=sheet, rows=slice(start, end), info=info))
+
+    logging.info(f"Planned {len(units)} work units for {n_rows} rows.")
+    return planned, units
@@ -1,25 +1,111 @@
 import sys
 import logging
 
-import pandas as pd
 import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from utils.utils import add_logging, pause
+from utils.interactive import handle_empty_export
+from utils.metrics import memory_mb
+
+
+# columns of the Replicon Export the reports read and their dtypes,
+# all other columns are dropped before any grouping happens
+EXPORT_SCHEMA = {
+    "Entry Date": "datetime64[ns]",
+    "First Name": "category",
+    "Last Name": "category",
+    "Email": "category",
+    "Client Name": "category",
+    "Project Name": "category",
+    "Project Code": "category",
+    "Task Name": "category",
+    "Task Code": "category",
+    "Hours": "float64",
+    "Comments": "object",
+}
+# bump whenever the output of prepare_df changes, invalidates the export cache
+SCHEMA_VERSION = "2"
+# columns which identify a booking, a booking contained in several exports is kept once
+BOOKING_KEY = ["Entry Date", "Email", "Project Code", "Task Name", "Hours", "Comments"]
+# Replicon writes this instead of leaving a field empty
+NONE_MARKER = "< None >"
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def _is_missing_category(column_name, category):
+    if category == NONE_MARKER:
+        return True
+    # blank task names are treated as missing task names
+    return column_name == "Task Name" and isinstance(category, str) and not category.strip()
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    columns = {}
+    for name, dtype in EXPORT_SCHEMA.items():
+        column = df[name]
+        if dtype == "category":
+            # the markers only have to be removed from the unique values
+            column = column.astype("category")
+            missing = [c for c in column.cat.categories if _is_missing_category(name, c)]
+            column = column.cat.remove_categories(missing)
+        else:
+            column = column.mask(column == NONE_MARKER)
+            if dtype.startswith("datetime"):
+                # one vectorized call for the whole column
+                column = pd.to_datetime(column, format=DATE_FORMAT)
+            elif dtype != "object":
+                column = pd.to_numeric(column).astype(dtype)
+        columns[name] = column
+    return pd.DataFrame(columns)
+
+
+def memory_usage_mb(df: pd.DataFrame) -> float:
+    return round(df.memory_usage(deep=True).sum() / 1024**2, 2)
+
+
+def filter_clients(df: pd.DataFrame, client_names=None) -> pd.DataFrame:
+    # client relevant data, only the given clients (values of "Client Name") if any
+    df = df.dropna(subset=["Client Name"])
+    if client_names is not None:
+        df = df[df["Client Name"].isin(client_names)]
+    return df
+
 
-from utils.utils import add_logging
+def concat_chunks(chunks: list) -> pd.DataFrame:
+    # categorical columns get the sorted union of the categories of all chunks,
+    # like a single astype("category") over the whole column
+    columns = {}
+    for name in chunks[0].columns:
+        parts = [chunk[name] for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            try:
+                column = union_categoricals(parts, sort_categories=True)
+            except TypeError:
+                # the categories of the chunks have different types, e.g. numbers and text
+                column = pd.Categorical(pd.concat([part.astype(object) for part in parts]))
+            columns[name] = pd.Series(column, index=pd.concat(parts).index)
+        else:
+            columns[name] = pd.concat(parts)
+    return pd.DataFrame(columns)
 
 
 @add_logging
-def prepare_df(file):
+def prepare_df(df, classifier=None, client_names=None):
     try:
-        # skipfooter -> skip last n rows
-        df = pd.read_excel(file, skipfooter=1)
-        df = df.replace("< None >", np.NaN)
-        df["Task Name"].replace(r'^\s*$', np.NaN, regex=True, inplace=True)
-        # client relevant data
-        df = df.dropna(subset=["Client Name"])
-        # transform to real datetime object
-        df["Entry Date"] = df["Entry Date"].apply(lambda x: pd.to_datetime(x, format="%Y-%m-%d"))
-
-        assert len(df) != 0, "created DataFrame is empty"
+        memory_before = memory_usage_mb(df)
+        df = apply_schema(df)
+        df = filter_clients(df, client_names)
+        # classify every distinct comment once, instead of per row in the reports
+        if classifier is not None:
+            df["Activity"], df["Display Comment"] = classifier.classify_column(df["Comments"])
+
+        if len(df) == 0:
+            handle_empty_export(client_names)
+        memory_after = memory_usage_mb(df)
+        logging.info(f"DataFrame memory usage: {memory_before} MB before and "
+                     f"{memory_after} MB after preprocessing.")
         logging.info("Successfully prepared dataframe.")
         return df
     
@@ -28,6 +114,67 @@ def prepare_df(file):
         logging.error(f"{e}")
         sys.exit()
 
+
+@add_logging
+def prepare_chunks(chunks, classifier=None, client_names=None, max_memory_mb=None) -> pd.DataFrame:
+    """
+    Bounded memory variant of prepare_df for the chunks of read_export_chunks.
+    Every chunk gets the schema and the client filter right away, so only the
+    kept rows and the columns of the schema stay in memory. Exits if the memory
+    of the process (or of the kept rows, where it cannot be measured) exceeds
+    max_memory_mb.
+    """
+    kept, n_rows, size = [], 0, 0
+    for chunk in chunks:
+        n_rows += len(chunk)
+        chunk = filter_clients(apply_schema(chunk), client_names)
+        kept.append(chunk)
+        size += chunk.memory_usage(deep=True).sum() / 1024**2
+        used = memory_mb()
+        used = size if used is None else used
+        if max_memory_mb and used > max_memory_mb:
+            logging.warning(f"Memory ceiling of {max_memory_mb} MB exceeded after {n_rows} rows.")
+            print(f"[ERROR] Reading the Replicon Export needs more than {max_memory_mb} MB "
+                  f"(exceeded after {n_rows} rows).")
+            print("Please filter the export by client ('client_names' in the config) "
+                  "or raise the memory ceiling.")
+            pause("Aborting. Press any key to exit ...")
+            sys.exit(1)
+
+    kept = [chunk for chunk in kept if len(chunk)]
+    if not kept:
+        handle_empty_export(client_names)
+    df = concat_chunks(kept)
+    # classify every distinct comment once, instead of per row in the reports
+    if classifier is not None:
+        df["Activity"], df["Display Comment"] = classifier.classify_column(df["Comments"])
+    logging.info(f"Kept {len(df)} of {n_rows} rows, DataFrame memory usage: {memory_usage_mb(df)} MB.")
+    return df
+
+
+@add_logging
+def merge_exports(frames: list) -> pd.DataFrame:
+    """
+    Concatenates the prepared DataFrames of several exports and removes the
+    bookings of overlapping exports. Bookings are identified by a hash of the
+    BOOKING_KEY columns. Identical bookings within one export are all kept, a
+    booking shows up as often as in the export which contains it most often.
+    """
+    df = concat_chunks(frames).reset_index(drop=True)
+    booking = pd.util.hash_pandas_object(df[BOOKING_KEY], index=False).to_numpy()
+    source = np.repeat(np.arange(len(frames)), [len(data) for data in frames])
+    # the n-th occurrence of a booking within its export
+    occurrence = pd.DataFrame({"source": source, "booking": booking}).groupby(
+        ["source", "booking"], sort=False).cumcount().to_numpy()
+    duplicated = pd.DataFrame({"booking": booking, "occurrence": occurrence}).duplicated().to_numpy()
+    if duplicated.any():
+        df = df[~duplicated].reset_index(drop=True)
+    logging.info(f"Merged {len(frames)} exports, removed {int(duplicated.sum())} duplicate bookings.")
+    print(f"Merged {len(frames)} Replicon Exports with {len(df)} bookings "
+          f"({int(duplicated.sum())} duplicates removed).")
+    return df
+
+
 def clean_name(name):
     new_name = name
     forbidden = ["/", "\\", ":", "*", "\"", "?", "<", ">", "|"]
@@ -38,28 +185,53 @@ def clean_name(name):
     return new_name
 
 
-@add_logging
-def merge_groups(groups, client_info, long_task_name=True) -> dict:
-    merged_groups = {}
-    for task_name, task_name_group in groups:
-        # some task names contain the WorkItem, which is not necessary
-        # for those one can split the long task name and only use the first part
-        if long_task_name:
-            task_name = task_name.split()[0]
-        task_name = task_name.strip()
-        if task_name in client_info.get("additional_tasks").keys():
-            task_name = client_info.get("additional_tasks").get(task_name)
-        if merged_groups.get(task_name) is None:
-            merged_groups[task_name] = []
-        merged_groups[task_name].append(task_name_group)
-            
-    # groups is list of groups and will be replaced by one merged group for
-    # the corresponding mapped task
-    for task_name, groups in merged_groups.items():
-        task_name_group = pd.concat(groups)
-        task_name_group.sort_values("Entry Date", inplace=True)
-        merged_groups[task_name] = task_name_group
-
-    logging.info("Successfully merged groups.")
-    return merged_groups
+def normalize_task_name(task_name: str, client_info: dict, long_task_name=True) -> str:
+    # some task names contain the WorkItem, which is not necessary
+    # for those one can split the long task name and only use the first part
+    if long_task_name:
+        task_name = task_name.split()[0]
+    task_name = task_name.strip()
+    if task_name in client_info.get("additional_tasks").keys():
+        task_name = client_info.get("additional_tasks").get(task_name)
+    return task_name
+
+
+def normalize_task_names(task_names: pd.Series, client_info: dict, long_task_name=True) -> pd.Series:
+    """
+    Normalizes the categorical Task Name column with normalize_task_name. Every
+    category is normalized once, tasks which belong together share one category
+    afterwards. Missing task names stay missing.
+    """
+    normalized, merged = pd.factorize(np.array(
+        [normalize_task_name(name, client_info, long_task_name) for name in task_names.cat.categories],
+        dtype=object))
+    codes = task_names.cat.codes.to_numpy()
+    new_codes = np.full(len(codes), -1, dtype=np.intp)
+    valid = codes >= 0
+    new_codes[valid] = normalized[codes[valid]]
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories=merged),
+                     index=task_names.index, name="Task")
+
+
+def split_tasks(group: pd.DataFrame) -> dict:
+    """
+    Splits the rows of a report by the normalized "Task" column. One stable sort
+    by task and date orders all tasks at once, the rows of a task are ordered by
+    date and keep the order of the export on the same day.
+    Returns the rows of every task as a slice of the sorted rows.
+    """
+    codes = group["Task"].cat.codes.to_numpy()
+    order = np.lexsort((group["Entry Date"].to_numpy(), codes))
+    codes = codes[order]
+    rows = group.take(order)
 
+    changed = np.empty(len(codes), dtype=bool)
+    changed[:1] = True
+    changed[1:] = codes[1:] != codes[:-1]
+    starts = np.flatnonzero(changed)
+    ends = np.append(starts[1:], len(codes))
+    categories = group["Task"].cat.categories
+    tasks = {categories[codes[start]]: rows.iloc[start:end]
+             for start, end in zip(starts, ends) if codes[start] >= 0}
+    logging.info(f"Split {len(group)} rows into {len(tasks)} tasks.")
+    return tasks
@@ -1,9 +1,19 @@
+import os
 import calendar
-from datetime import datetime, date
+import logging
+from datetime import date
 from abc import ABC, abstractmethod
 
+import numpy as np
 import pandas as pd
 
+from utils.aggregation import daily_table, unit_ids, unit_bounds, hours_cube, task_totals
+from utils.dates import DateDimension, day_keys, GERMAN_DATE_FORMAT
+from utils.classification import ActivityClassifier, normalize_comment
+from utils.preprocessing import normalize_task_names, split_tasks
+from utils.write_only import StyleCopier, create_write_only_workbook, copy_sheet_setup, copy_rows,\
+                             template_extras
+from utils.metrics import span
 from utils.utils import add_logging
 
 """
@@ -13,7 +23,39 @@ like this: ClientReport + <id>
 the client id can be found in the config file and should never be exposed
 """
 
+# client id in the config -> report class, see register_report
+REPORTS = {}
+
+
+def register_report(*client_ids):
+    """
+    Registers a Report subclass for the client ids of the config. A new kind of
+    client needs a subclass, which declares its partition keys, its output
+    layout (layout) and how its workbooks are filled (build), and its id.
+    """
+    def register(cls):
+        for client_id in client_ids:
+            REPORTS[client_id] = cls
+        return cls
+    return register
+
+
+def report_class(client_info: dict) -> type:
+    return REPORTS[client_info.get("id")]
+
+
 class Report(ABC):
+    """
+    A report fills one sheet. The class methods are the strategy of the client
+    type, which plan_reports, create_jobs, fill_workbook and the validation use
+    for every client the same way.
+    """
+
+    # partition keys after client name and project code, in order of precedence,
+    # "Year" and "Month" are taken from the entry date, see utils.planning
+    partition_keys = []
+    # schema of the client section of the config, see utils.validation
+    config_schema = {"type": dict, "keys": {}}
 
     def __init__(self,
                  group: pd.DataFrame):
@@ -27,8 +69,81 @@ class Report(ABC):
     def fill_worksheet(self, *args, **kwargs) -> None:
         pass
 
+    @classmethod
+    @abstractmethod
+    def layout(cls, client: str, wbs_folder: str, project_name: str, planned: pd.DataFrame,
+               start: int) -> tuple:
+        # target file (relative to the output folder), sheet and info of the work
+        # unit starting at row start of the planned DataFrame
+        pass
+
+    @classmethod
+    @abstractmethod
+    def build(cls, workbook, job: dict, stamp):
+        # fills the reports of the job into the cloned template, returns the workbook to save
+        pass
+
+    @classmethod
+    def client_schema(cls, client_info: dict) -> dict:
+        return cls.config_schema
+
+    @classmethod
+    def check_config(cls, client: str, config: dict) -> list:
+        # problems of the config beyond the schema
+        return []
 
+    @classmethod
+    def preflight(cls, data: pd.DataFrame, client: str, config: dict, sheet_names: list) -> list:
+        # problems of the data with the config and the template, see utils.validation
+        return []
+
+    @classmethod
+    def prepare(cls, data: pd.DataFrame, planned: pd.DataFrame, work_units: list, client_info: dict,
+                classifier, cube: pd.DataFrame = None) -> dict:
+        # computations shared by all work units of the client, see unit_report
+        return {}
+
+    @classmethod
+    def job_fields(cls, context: dict) -> dict:
+        # entries of every job of the client, e.g. shared lookup tables
+        return {}
+
+    @classmethod
+    def unit_report(cls, context: dict, i: int, group: pd.DataFrame, info: dict,
+                    target_path: str) -> tuple:
+        # rows and info of the report of work unit i
+        return group, info
+
+    @classmethod
+    def describe(cls, job: dict) -> list:
+        # one record per sheet with its rows and hours, see describe_jobs
+        return [{"sheet": sheet_name, "rows": len(group), "hours": float(group["Hours"].sum())}
+                for sheet_name, group, _ in job["reports"]]
+
+
+# cell of the template as [row, column]
+REFERENCE = {"type": list, "length": 2, "items": int}
+
+
+@register_report(1)
 class ClientReport1(Report):
+    """
+    One sheet per employee and month, one file per wbs code and month.
+    """
+
+    partition_keys = ["Year", "Month", "Last Name"]
+    config_schema = {
+        "type": dict,
+        "keys": {
+            "references": {"type": dict, "keys": {"weekday": REFERENCE, "date": REFERENCE,
+                                                  "hours": REFERENCE, "description": REFERENCE}},
+            "header_references": {"type": dict, "keys": {"Mitarbeiter": "cell", "Projekt": "cell",
+                                                         "Berichtsmonat": "cell", "Datum": "cell"}},
+            "template_sheet_name": str,
+            "max_range_rows": int,
+        },
+        "optional": {"id": int, "skip_style": bool, "client_names": {"type": list, "items": str}}
+    }
 
     def __init__(self,
                  group: pd.DataFrame,
@@ -37,7 +152,9 @@ class ClientReport1(Report):
                  employee_name: str,
                  project_name: str,
                  references: dict,
-                 header_references: dict):
+                 header_references: dict,
+                 daily: pd.DataFrame = None,
+                 dates: DateDimension = None):
         super().__init__(group)
         
         self.month = month
@@ -49,63 +166,49 @@ class ClientReport1(Report):
         self.references = references if references else None
         self.header_references = header_references if header_references else None
 
+        # hours and comment per day, rows of the table created by daily_table
+        self.daily = daily
+        # shared calendar of the run, only the month of the report otherwise
+        if dates is None or not dates.covers(year, month):
+            dates = DateDimension(date(year, month, 1), date(year, month, 1))
+        self.dates = dates
+
     def get_report_date(self) -> str:
         if self.month and self.year:
             return f"{calendar.month_name[self.month]} {self.year}"
         raise Exception("No month or year (or both not) provided.")
     
     def get_weekdays_to_dates(self) -> tuple[list[str], list[str]]:
-        cal = calendar.monthcalendar(self.year, self.month)
-        weekday_names = calendar.weekheader(3).split()
-
-        weekdays = []
-        dates = []
-        for week in cal:
-            for i, day in enumerate(week):
-                if day != 0:
-                    weekdays.append(weekday_names[i])
-                    date = datetime(self.year, self.month, day).strftime("%d.%m.%Y")
-                    dates.append(date)
-
-        return weekdays, dates
+        month = self.dates.month(self.year, self.month)
+        return self.dates.weekdays[month], self.dates.labels[month]
     
-    def get_hours_by_date(self) -> dict:
-        d = {}
-        for _, row in self.group.iterrows():
-            date = row["Entry Date"].to_pydatetime().strftime("%d.%m.%Y")
-            hours = row["Hours"]
-            if not date in d.keys():
-                d[date] = hours
-            # if, for whatever reason, employee booked multiple times on the same date
-            else:
-                # print(f"[WARNING] {self.employee_name} booked multiple times on same date: {date}")
-                d[date] += hours
-        return d
+    def _get_daily(self, code_to_activity=None, additional_comments=None) -> pd.DataFrame:
+        if self.daily is not None:
+            return self.daily
+        return daily_table(self.group,
+                           np.zeros(len(self.group), dtype=np.intp),
+                           ActivityClassifier(code_to_activity or {}, additional_comments))
+
+    def _day_positions(self, daily: pd.DataFrame) -> list:
+        # position of every day of the daily table in the month, by integer day key
+        keys = daily["Day"].to_numpy() if "Day" in daily else day_keys(daily["Entry Date"])
+        return (keys - self.dates.keys[self.dates.month(self.year, self.month).start]).tolist()
+
+    def get_hours_by_day(self) -> dict:
+        daily = self._get_daily()
+        # if, for whatever reason, employee booked multiple times on the same date
+        # the hours are summed up
+        return dict(zip(self._day_positions(daily), daily["Hours"]))
 
     # code_to_activity should consists of a mapping from a code, e.g. "001", to
     # a specific activity, e.g. "Gematik-Abstimmung"
     # additional_comments is a list of exceptions for the codes where the actual comment
     # should be used as well instead of just the activity corresponding to the code
-    def get_comment_by_date(self, code_to_activity: dict, additional_comments: list) -> dict:
-        d = {}
-        for _, row in self.group.iterrows():
-            date = row["Entry Date"].to_pydatetime().strftime("%d.%m.%Y")
-            comment = str(row["Comments"])
-            if not comment:
-                continue
-            for code, activity in code_to_activity.items():
-                if code in comment:
-                    # only if the code is not in the additional comments list
-                    # replace the comment by the code
-                    if code not in additional_comments:
-                        comment = activity
-                    break
-            if not date in d.keys():
-                d[date] = comment
-            else:
-                # take longer comment in case of multiple occasions of same date
-                d[date] = d[date] if len(comment) < len(d[date]) else comment
-        return d
+    def get_comment_by_day(self, code_to_activity: dict, additional_comments: list) -> dict:
+        daily = self._get_daily(code_to_activity, additional_comments)
+        # the longer comment is taken in case of multiple occasions of same date
+        return {day: comment for day, comment in zip(self._day_positions(daily), daily["Comment"])
+                if comment is not None}
     
     # sheet is openpyxl worksheet
     @add_logging
@@ -114,14 +217,17 @@ class ClientReport1(Report):
             sheet[self.header_references["Mitarbeiter"]] = self.employee_name
             sheet[self.header_references["Projekt"]] = self.project_name
             sheet[self.header_references["Berichtsmonat"]] = self.get_report_date()
-            sheet[self.header_references["Datum"]] = date.today().strftime("%d.%m.%Y")
+            sheet[self.header_references["Datum"]] = date.today().strftime(GERMAN_DATE_FORMAT)
     
     # sheet is openpyxl worksheet
+    # returns the number of cells written
     @add_logging
-    def fill_worksheet(self, sheet, code_to_activity, additional_comments):
+    def fill_worksheet(self, sheet, code_to_activity, additional_comments) -> int:
         weekdays, dates = self.get_weekdays_to_dates()
-        hours = self.get_hours_by_date()
-        comments = self.get_comment_by_date(code_to_activity, additional_comments)
+        # both are keyed by the position of the day in the month, i.e. the row offset
+        hours = self.get_hours_by_day()
+        comments = self.get_comment_by_day(code_to_activity, additional_comments)
+        written = 2 * len(weekdays)
         for i in range(0, len(weekdays)):
             sheet.cell(
                 row=self.references["weekday"][0] + i,
@@ -133,68 +239,326 @@ class ClientReport1(Report):
                 column=self.references["date"][1],
                 value=dates[i]
             )
-            if dates[i] in hours.keys():
+            if i in hours:
                 # same row as in dates can be used
                 sheet.cell(
                     row=self.references["date"][0] + i,
                     column=self.references["hours"][1],
-                    value=hours.get(dates[i])
+                    value=hours[i]
                 )
-            if dates[i] in comments.keys():
+                written += 1
+            if i in comments:
                 # same row as in dates can be used
                 sheet.cell(
                     row=self.references["date"][0] + i,
                     column=self.references["description"][1],
-                    value=comments.get(dates[i])
+                    value=comments[i]
                 )
+                written += 1
+        return written
+
+    @classmethod
+    def check_config(cls, client: str, config: dict) -> list:
+        # every employee sheet is a copy of the template sheet
+        if config.get("Clients").get(client).get("skip_style"):
+            return [f"'config.Clients.{client}.skip_style' is not supported for client id 1"]
+        return []
 
+    @classmethod
+    def preflight(cls, data: pd.DataFrame, client: str, config: dict, sheet_names: list) -> list:
+        client_info = config.get("Clients").get(client)
+        if client_info.get("template_sheet_name") not in sheet_names:
+            return [f"Template sheet '{client_info.get('template_sheet_name')}' is missing "
+                    f"in the template of '{client}'."]
+        return []
 
+    @classmethod
+    def layout(cls, client: str, wbs_folder: str, project_name: str, planned: pd.DataFrame,
+               start: int) -> tuple:
+        entry_date = planned["Entry Date"].iat[start]
+        employee_name = f"{planned['First Name'].iat[start]} {planned['Last Name'].iat[start]}"
+        return (os.path.join(wbs_folder, str(entry_date.year), f"{calendar.month_name[entry_date.month]}.xlsx"),
+                employee_name,
+                {"month": entry_date.month, "year": entry_date.year,
+                 "employee_name": employee_name, "project_name": project_name})
+
+    @classmethod
+    def prepare(cls, data: pd.DataFrame, planned: pd.DataFrame, work_units: list, client_info: dict,
+                classifier, cube: pd.DataFrame = None) -> dict:
+        # hours and comment per employee, project and day for all reports in one pass
+        with span("aggregate", rows=len(planned)):
+            daily = daily_table(planned, unit_ids(work_units, len(planned)), classifier)
+            return {"daily": daily,
+                    "bounds": unit_bounds(daily, len(work_units)),
+                    # one calendar for all reports
+                    "dates": DateDimension.from_dates(planned["Entry Date"])}
+
+    @classmethod
+    def job_fields(cls, context: dict) -> dict:
+        return {"dates": context["dates"]}
+
+    @classmethod
+    def unit_report(cls, context: dict, i: int, group: pd.DataFrame, info: dict,
+                    target_path: str) -> tuple:
+        bounds = context["bounds"]
+        return group, {**info, "daily": context["daily"].iloc[bounds[i]:bounds[i + 1]]}
+
+    @classmethod
+    def build(cls, workbook, job: dict, stamp):
+        client_info = job["config"].get("Clients").get(job["client"])
+        # employee level (excel sheet in the month file)
+        # creates report for every employee
+        for sheet_name, group, info in job["reports"]:
+            employee_sheet = workbook.create_sheet(sheet_name)
+            # copy merged cells, styles, values and dimensions of the template
+            with span("stamp", sheets=1, cells=len(stamp.cells)):
+                stamp.apply(employee_sheet)
+            with span("fill", rows=len(group), sheets=1) as counts:
+                report = cls(group,
+                             month=info["month"],
+                             year=info["year"],
+                             employee_name=info["employee_name"],
+                             project_name=info["project_name"],
+                             references=client_info.get("references"),
+                             header_references=client_info.get("header_references"),
+                             daily=info.get("daily"),
+                             dates=job.get("dates"))
+                counts["cells"] = report.fill_worksheet(employee_sheet, job["code_to_activity"],
+                                                        job["additional_comments"])
+                report.fill_header(employee_sheet)
+
+        workbook.remove(workbook[client_info.get("template_sheet_name")])
+        return workbook
+
+    @classmethod
+    def describe(cls, job: dict) -> list:
+        records = []
+        for sheet_name, group, info in job["reports"]:
+            daily = info.get("daily")
+            hours = daily["Hours"].sum() if daily is not None else group["Hours"].sum()
+            records.append({"sheet": sheet_name, "rows": len(group), "hours": float(hours),
+                            "project": info["project_name"], "year": info["year"],
+                            "month": info["month"], "employee": info["employee_name"]})
+        return records
+
+
+@register_report(2)
 class ClientReport2(Report):
+    """
+    One sheet per task, one file per wbs code. Client 2 only uses the first
+    word of the task names, see normalize_task_name.
+    """
+
+    long_task_name = True
+    config_schema = {
+        "type": dict,
+        "keys": {"header_references": {"type": dict, "values": "cell"},
+                 "additional_tasks": {"type": dict, "values": str}},
+        "optional": {"id": int, "skip_style": bool, "client_names": {"type": list, "items": str}}
+    }
 
     def __init__(self,
                  group: pd.DataFrame,
                  task_name: str,
                  grades: dict,
-                 header_references: dict):
+                 header_references: dict,
+                 hours: float = None):
         super().__init__(group)
 
         self.task_name = task_name
         self.grades = grades
         self.header_references = header_references
+        # total hours of the task, e.g. from the hours cube
+        self.hours = hours
 
     @add_logging
     def fill_header(self, sheet) -> None:
         ref = self.header_references[self.task_name]
-        sheet[ref] = self.group["Hours"].sum()
+        sheet[ref] = self.hours if self.hours is not None else self.group["Hours"].sum()
+
+    def get_comments(self, code_to_activity, additional_comments) -> pd.Series:
+        # comments are classified during preprocessing
+        if "Display Comment" in self.group:
+            return self.group["Display Comment"]
+        classifier = ActivityClassifier(code_to_activity, additional_comments)
+        return self.group["Comments"].map(
+            lambda comment: classifier.display(normalize_comment(comment)))
+
+    def get_rows(self, comments: pd.Series, chunk_size: int = 10000):
+        """
+        Yields the rows of the task sheet (grade, date, hours, comment), the columns
+        are converted to python values chunk by chunk.
+        """
+        names = (self.group["First Name"].astype(str).str.strip() + " "
+                 + self.group["Last Name"].astype(str).str.strip())
+        missing = names[~names.isin(self.grades.keys())]
+        if len(missing):
+            raise KeyError(missing.iloc[0])
+        grades = names.map(self.grades)
+        for start in range(0, len(self.group), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            yield from zip(grades.iloc[chunk].tolist(),
+                           self.group["Entry Date"].iloc[chunk].tolist(),
+                           self.group["Hours"].iloc[chunk].tolist(),
+                           comments.iloc[chunk].tolist())
 
+    # returns the number of cells written
     @add_logging
-    def fill_worksheet(self, sheet, code_to_activity, additional_comments) -> None:
+    def fill_worksheet(self, sheet, code_to_activity, additional_comments) -> int:
+        comments = self.get_comments(code_to_activity, additional_comments)
         # delete ugly formatting from excel sheet, start at 2 to keep header
         sheet.delete_rows(2, sheet.max_row)
-        for _, row in self.group.iterrows():
-            date = row["Entry Date"]
-            employee_name = row["First Name"].strip() + " " + row["Last Name"].strip()
-            grade = self.grades[employee_name]
-            hours = row["Hours"]
-
-            comment = self._get_comment(row["Comments"], code_to_activity, additional_comments)
-            
-            info = [grade, date, hours, comment]
-            sheet.append(info)
-
-    def _get_comment(self, raw_comment, code_to_activity, additional_comments) -> str:
-        comment = raw_comment
-        # someone wrote 1, 2, 5, etc. instead of 001, 002, 005
-        if isinstance(comment, int):
-            comment = "00" + str(comment)
-        elif pd.isna(comment):
-            comment = "MISSING COMMENT"
-        for code, activity in code_to_activity.items():
-            if code in comment:
-                # only if the code is not in the additional comments list
-                # replace the comment by the code
-                if code not in additional_comments:
-                    comment = activity
-                break
-        return comment
-    
\ No newline at end of file
+        written = 0
+        for row in self.get_rows(comments):
+            sheet.append(row)
+            written += len(row)
+        return written
+
+    # sheet is a write-only openpyxl worksheet, template_sheet the task sheet of the template
+    # the rows are streamed to the file, so the memory does not grow with the number of rows
+    # returns the number of cells written
+    @add_logging
+    def stream_worksheet(self, sheet, template_sheet, styles, code_to_activity,
+                         additional_comments) -> int:
+        comments = self.get_comments(code_to_activity, additional_comments)
+        # only the header of the template is kept
+        copy_sheet_setup(template_sheet, sheet, styles)
+        written = copy_rows(template_sheet, sheet, styles, max_row=1)
+        for row in self.get_rows(comments):
+            sheet.append(row)
+            written += len(row)
+        return written
+
+    @classmethod
+    def check_config(cls, client: str, config: dict) -> list:
+        if "Grades" not in config:
+            return [f"'config.Grades' is needed for client '{client}'"]
+        return []
+
+    @classmethod
+    def preflight(cls, data: pd.DataFrame, client: str, config: dict, sheet_names: list) -> list:
+        client_info = config.get("Clients").get(client)
+        problems = []
+        # only entries with a task end up in the reports
+        rows = data[data["Task Name"].notna() & data["Project Code"].notna()]
+        names = (rows["First Name"].astype(str).str.strip() + " "
+                 + rows["Last Name"].astype(str).str.strip()).unique()
+        grades = config.get("Grades") or {}
+        for name in sorted(name for name in names if name not in grades):
+            problems.append(f"Employee '{name}' has no grade in the config.")
+
+        header_references = client_info.get("header_references")
+        task_names = normalize_task_names(rows["Task Name"], client_info,
+                                          long_task_name=cls.long_task_name).dropna().unique()
+        for task_name in sorted(task_names):
+            if task_name not in sheet_names:
+                problems.append(f"Task '{task_name}' has no sheet in the template of '{client}'.")
+            if task_name not in header_references:
+                problems.append(f"Task '{task_name}' has no header reference for '{client}' in the config.")
+        return problems
+
+    @classmethod
+    def layout(cls, client: str, wbs_folder: str, project_name: str, planned: pd.DataFrame,
+               start: int) -> tuple:
+        # one report covers the whole wbs code
+        return os.path.join(wbs_folder, f"{client}_Stundenaufstellung.xlsx"), None, {"project_name": project_name}
+
+    @classmethod
+    def prepare(cls, data: pd.DataFrame, planned: pd.DataFrame, work_units: list, client_info: dict,
+                classifier, cube: pd.DataFrame = None) -> dict:
+        # some tasks belong together, their names are normalized once for all reports
+        planned["Task"] = normalize_task_names(planned["Task Name"], client_info,
+                                               long_task_name=cls.long_task_name)
+        # the task totals of "Uebersicht" come from the cube
+        with span("aggregate", rows=len(planned)):
+            if cube is None:
+                cube = hours_cube(data)
+            totals = task_totals(cube, client_info, long_task_name=cls.long_task_name)
+        return {"totals": totals}
+
+    @classmethod
+    def unit_report(cls, context: dict, i: int, group: pd.DataFrame, info: dict,
+                    target_path: str) -> tuple:
+        key = (group["Client Name"].iat[0], group["Project Code"].iat[0])
+        # entries without task are not reported, generate_reports hands them to the user
+        info = {**info, "task_hours": context["totals"].get(key, {}),
+                "no_tasks": group[pd.isna(group["Task Name"])]}
+        return group.dropna(subset=["Task Name"]), info
+
+    @classmethod
+    def build(cls, workbook, job: dict, stamp):
+        config = job["config"]
+        client_info = config.get("Clients").get(job["client"])
+        _, wbs_group, info = job["reports"][0]
+        with span("split_tasks", rows=len(wbs_group)):
+            # tasks which belong together are already merged, see prepare
+            task_name_groups = split_tasks(wbs_group)
+
+        # create report for every task
+        reports = {}
+        for task_name, task_name_group in task_name_groups.items():
+            # every task has a sheet in the template, see preflight
+            report = cls(task_name_group,
+                         task_name=task_name,
+                         grades=config.get("Grades"),
+                         header_references=client_info.get("header_references"),
+                         hours=info.get("task_hours", {}).get(task_name))
+            report.fill_header(workbook["Uebersicht"])
+            reports[task_name] = report
+        extras = template_extras(workbook)
+        if extras:
+            # a write-only copy would lose these, the task sheets are filled in place
+            logging.info(f"Filling the template in place, it contains {', '.join(extras)}.")
+            for task_name, report in reports.items():
+                with span("fill", rows=len(report.group), sheets=1) as counts:
+                    counts["cells"] = report.fill_worksheet(workbook[task_name], job["code_to_activity"],
+                                                            job["additional_comments"])
+            return workbook
+        # the task sheets are streamed into a write-only copy of the template
+        return stream_task_sheets(workbook, reports, job)
+
+    @classmethod
+    def describe(cls, job: dict) -> list:
+        # the hours are the task totals fill_header writes to "Uebersicht"
+        client_info = job["config"].get("Clients").get(job["client"])
+        _, wbs_group, info = job["reports"][0]
+        task_hours = info.get("task_hours", {})
+        records = []
+        for task_name, task_name_group in split_tasks(wbs_group).items():
+            hours = task_hours.get(task_name, task_name_group["Hours"].sum())
+            records.append({"sheet": task_name, "rows": len(task_name_group), "hours": float(hours),
+                            "project": info["project_name"],
+                            "header_reference": client_info.get("header_references").get(task_name)})
+        return records
+
+
+@register_report(3)
+class ClientReport3(ClientReport2):
+    """
+    Like ClientReport2, with the full task names.
+    """
+
+    long_task_name = False
+
+
+def stream_task_sheets(template, reports: dict, job: dict):
+    """
+    Writes a write-only copy of the filled template. The task sheets with a report
+    keep the header of the template and get their rows streamed, all other sheets
+    are copied as they are.
+    """
+    output_excel = create_write_only_workbook(template)
+    styles = StyleCopier()
+    for template_sheet in template.worksheets:
+        sheet = output_excel.create_sheet(template_sheet.title)
+        report = reports.get(template_sheet.title)
+        if report is not None:
+            with span("fill", rows=len(report.group), sheets=1) as counts:
+                counts["cells"] = report.stream_worksheet(sheet, template_sheet, styles,
+                                                          job["code_to_activity"],
+                                                          job["additional_comments"])
+        else:
+            with span("stamp", sheets=1) as counts:
+                copy_sheet_setup(template_sheet, sheet, styles)
+                counts["cells"] = copy_rows(template_sheet, sheet, styles)
+    return output_excel
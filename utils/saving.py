@@ -0,0 +1,83 @@
+import os
+import queue
+import logging
+import datetime
+import threading
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from openpyxl.writer.excel import ExcelWriter
+
+from utils.metrics import span
+
+
+def save_workbook(workbook, path: str, compression_level: int = None) -> int:
+    """
+    Saves the workbook like workbook.save, with the zlib compression level of the
+    xlsx archive (0 is fastest, 9 is smallest, None is the default of openpyxl).
+    Returns the size of the file in bytes.
+    """
+    if workbook.write_only and not workbook.worksheets:
+        workbook.create_sheet()
+    with span("save", sheets=len(workbook.sheetnames)) as counts:
+        with ZipFile(path, "w", ZIP_DEFLATED, allowZip64=True, compresslevel=compression_level) as archive:
+            workbook.properties.modified = datetime.datetime.utcnow()
+            ExcelWriter(workbook, archive).save()
+        counts["bytes"] = os.path.getsize(path)
+    logging.info(f"Saved '{path}'.")
+    return counts["bytes"]
+
+
+class BackgroundSaver:
+    """
+    Saves filled workbooks in a background thread, so the next workbook can be
+    filled while the previous one is compressed and written. At most queue_size
+    workbooks wait for the thread, submit blocks until there is room again,
+    which bounds the memory of the pending workbooks.
+
+    An error of the thread is raised by the next submit or by close.
+    """
+
+    def __init__(self, queue_size: int = 2, compression_level: int = None):
+        self.compression_level = compression_level
+        self._queue = queue.Queue(maxsize=max(queue_size, 1))
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="BackgroundSaver", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            workbook, path = item
+            if self._error is None:
+                try:
+                    save_workbook(workbook, path, self.compression_level)
+                except BaseException as e:
+                    self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(self, workbook, path: str) -> None:
+        self._raise_error()
+        self._queue.put((workbook, path))
+
+    def close(self) -> None:
+        # waits until all workbooks are saved
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # the pending workbooks are still saved, the error of the caller wins
+            self._queue.put(None)
+            self._thread.join()
@@ -1,33 +1,77 @@
-from copy import copy
+import string
+from openpyxl.cell.cell import Cell
+from openpyxl.styles.cell_style import StyleArray
 from openpyxl.utils import range_boundaries
 from utils.utils import add_logging
 
 
-@add_logging
-def copy_cell_styles(template_sheet, new_sheet):
-    for i, row in enumerate(template_sheet.rows, start=1):
-        for j, cell in enumerate(row, start=1):
-            new_cell = new_sheet.cell(row=i, column=j, value=cell.value)
-            if cell.has_style:
-                new_cell._style = copy(cell._style)
-
-
-# sheet is openpyxl worksheet
-@add_logging
-def adjust_cell_dimensions(sheet, target_dimensions: dict):
-    for col, width in target_dimensions["widths"].items():
-        sheet.column_dimensions[col].width = float(width)
-    for row, height in target_dimensions["heights"].items():
-        sheet.row_dimensions[row].height = float(height)
-
-        
-# sheet is openpyxl worksheet
-# target_ranges are openpyxl merged cell ranges
-@add_logging
-def merge_cells(sheet, target_ranges: set):
-    for merged_range in target_ranges:
-        min_row, min_col, max_row, max_col = range_boundaries(merged_range.coord)
-        sheet.merge_cells(start_row=min_col,
-                            start_column=min_row,
-                            end_row=max_col,
-                            end_column=max_row)
+# template_sheet is openpyxl worksheet
+def get_template_dimensions(template_sheet, max_range_rows: int) -> dict:
+    return {
+        "widths": {
+            col: template_sheet.column_dimensions[col].width for col in string.ascii_uppercase
+        },
+        "heights": {
+            row: template_sheet.row_dimensions[row].height for row in range(1, max_range_rows)
+                if template_sheet.row_dimensions[row].height is not None
+        }
+    }
+
+
+class TemplateStamp:
+    """
+    Template sheet compiled once per run.
+
+    Holds the cell values with their style ids, the merged ranges and the cell
+    dimensions of the template, so applying it to a new sheet copies the template
+    sheet without walking it again. The style ids refer to the style tables of the
+    template workbook, the output workbook has to be a copy of it.
+    """
+
+    def __init__(self, template_sheet, target_dimensions: dict):
+        self.merged_ranges = [range_boundaries(merged_range.coord)
+                              for merged_range in template_sheet.merged_cells.ranges]
+        # identical style arrays share one tuple
+        styles = {}
+        self.cells = []
+        for i, row in enumerate(template_sheet.rows, start=1):
+            for j, cell in enumerate(row, start=1):
+                style = None
+                if cell.has_style:
+                    style = tuple(cell._style)
+                    style = styles.setdefault(style, style)
+                value = getattr(cell, "_value", None)
+                self.cells.append((i, j, value, getattr(cell, "data_type", "n"), style))
+        self.max_row = template_sheet.max_row
+        self.widths = {col: float(width) for col, width in target_dimensions["widths"].items()}
+        self.heights = {row: float(height) for row, height in target_dimensions["heights"].items()}
+
+    # sheet is a new openpyxl worksheet
+    @add_logging
+    def apply(self, sheet):
+        for min_col, min_row, max_col, max_row in self.merged_ranges:
+            sheet.merge_cells(start_row=min_row,
+                              start_column=min_col,
+                              end_row=max_row,
+                              end_column=max_col)
+        cells = sheet._cells
+        for row, column, value, data_type, style in self.cells:
+            cell = cells.get((row, column))
+            if cell is None:
+                cell = Cell(sheet, row=row, column=column, style_array=style)
+                cell._value = value
+                cell.data_type = data_type
+                cells[(row, column)] = cell
+                continue
+            # cells of merged ranges already exist
+            if value is not None:
+                cell._value = value
+                cell.data_type = data_type
+            if style is not None:
+                cell._style = StyleArray(style)
+        sheet._current_row = max(sheet._current_row, self.max_row)
+
+        for col, width in self.widths.items():
+            sheet.column_dimensions[col].width = width
+        for row, height in self.heights.items():
+            sheet.row_dimensions[row].height = height
@@ -0,0 +1,57 @@
+import logging
+
+import openpyxl
+import pandas as pd
+from openpyxl.styles import Font
+
+from utils.saving import save_workbook
+from utils.utils import add_logging
+
+
+# sheet name -> columns of the cube (see hours_cube) the hours are summed by
+ROLLUPS = {
+    "Kunden": ["Client Name", "Year", "Month"],
+    "WBS": ["Client Name", "Project Code", "Project Name", "Year", "Month"],
+    "Mitarbeiter": ["Employee", "Year", "Month"],
+}
+HEADERS = {
+    "Client Name": "Kunde", "Project Code": "WBS", "Project Name": "Projekt", "Task Name": "Task",
+    "Employee": "Mitarbeiter", "Year": "Jahr", "Month": "Monat", "Hours": "Stunden",
+}
+DETAIL_COLUMNS = ["Client Name", "Project Code", "Project Name", "Task Name", "Employee", "Year",
+                  "Month", "Hours"]
+
+
+def rollup(cube: pd.DataFrame, columns: list) -> pd.DataFrame:
+    return cube.groupby(columns, observed=True, sort=True)["Hours"].sum().reset_index()
+
+
+@add_logging
+def write_summary(cube: pd.DataFrame, path: str, compression_level: int = None) -> int:
+    """
+    Writes the hours of all clients in the export to one workbook: the rollups
+    by client, wbs code and employee per month and the whole cube. The rows are
+    streamed in a single pass per sheet. Returns the number of rows written.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    bold = Font(bold=True)
+    sheets = {name: rollup(cube, columns) for name, columns in ROLLUPS.items()}
+    sheets["Details"] = cube[DETAIL_COLUMNS]
+    written = 0
+    for name, table in sheets.items():
+        sheet = workbook.create_sheet(name)
+        header = []
+        for column in table.columns:
+            cell = openpyxl.cell.WriteOnlyCell(sheet, value=HEADERS[column])
+            cell.font = bold
+            header.append(cell)
+        sheet.append(header)
+        # python values column by column, missing values (e.g. no task) stay empty
+        columns = [table[column].astype(object).where(table[column].notna(), None).tolist()
+                   for column in table.columns]
+        for row in zip(*columns):
+            sheet.append(row)
+        written += len(table)
+    save_workbook(workbook, path, compression_level)
+    logging.info(f"Wrote summary of {len(cube)} cube cells to '{path}'.")
+    return written
@@ -1,19 +1,97 @@
+import time
 import logging
+import functools
 import sys
 
 
+# wall time of the decorated functions in this process:
+# qualified function name -> [number of calls, total seconds, max seconds]
+timings = {}
+
+MAX_REPR_LENGTH = 80
+
+# set to False for batch runs, nobody is there to press a key
+interactive = True
+
+
+def pause(message: str) -> None:
+    # waits for the user before the script goes on or exits
+    if interactive:
+        input(message)
+    else:
+        print(message)
+
+
+def summarize(value) -> str:
+    # short description of an argument, large objects are never fully formatted
+    shape = getattr(value, "shape", None)
+    if shape is not None:
+        return f"<{type(value).__name__} shape={shape}>"
+    if isinstance(value, (str, int, float, bool, type(None))):
+        text = repr(value)
+        return text if len(text) <= MAX_REPR_LENGTH else text[:MAX_REPR_LENGTH] + "...'"
+    if isinstance(value, (list, tuple, set, dict)):
+        return f"<{type(value).__name__} len={len(value)}>"
+    title = getattr(value, "title", None)
+    if isinstance(title, str):
+        return f"<{type(value).__name__} {title!r}>"
+    return f"<{type(value).__name__}>"
+
+
+def format_arguments(args, kwargs) -> str:
+    arguments = [summarize(arg) for arg in args]
+    arguments += [f"{key}={summarize(value)}" for key, value in kwargs.items()]
+    return f"({', '.join(arguments)})"
+
+
+def record_timing(name, seconds) -> None:
+    entry = timings.get(name)
+    if entry is None:
+        timings[name] = [1, seconds, seconds]
+    else:
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+
+def merge_timings(other: dict) -> None:
+    # adds the timings of another process, e.g. a worker of the process pool
+    for name, (calls, total, longest) in other.items():
+        entry = timings.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += calls
+        entry[1] += total
+        entry[2] = max(entry[2], longest)
+
+
+def log_timings() -> None:
+    # summary of the decorated functions, the most expensive first
+    logging.info("Time spent in decorated functions:")
+    for name, (calls, total, longest) in sorted(timings.items(), key=lambda item: -item[1][1]):
+        logging.info(f"  {name}: {calls} calls, {round(total, 3)} s total, "
+                     f"{round(total / calls * 1000, 3)} ms mean, {round(longest * 1000, 3)} ms max")
+
+
 # logging decorator
 def add_logging(func):
+    name = func.__qualname__
+
+    @functools.wraps(func)
     def create_logs(*args, **kwargs):
+        start = time.perf_counter()
         try:
             res = func(*args, **kwargs)
-            logging.info(f"Successfully ran function {func.__name__} with arguments: {args, kwargs}")
-            return res
         except Exception as e:
             logging.info(f"Error in '{func.__name__}' function. Terminated with error:")
-            logging.info(f"Function called with arguments: {args, kwargs}")
+            logging.info(f"Function called with arguments: {format_arguments(args, kwargs)}")
             logging.error(f"{e}")
             print("[ERROR] Unexpected behavior: Please send the log file to the developers.")
-            input("Press any key to exit ...")
-            sys.exit()
+            pause("Press any key to exit ...")
+            sys.exit(1)
+        delta = time.perf_counter() - start
+        record_timing(name, delta)
+        # the arguments are only formatted if the message is logged at all
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(f"Successfully ran function {func.__name__} in {round(delta, 4)} s "
+                         f"with arguments: {format_arguments(args, kwargs)}")
+        return res
     return create_logs
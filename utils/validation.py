@@ -1,14 +1,111 @@
+import re
+import sys
+import hashlib
 import logging
-import openpyxl
 
+import pandas as pd
 
-# sheet is openpyxl worksheet
-def validate_input_file(file):
+from utils.cache import file_hash
+from utils.interactive import column_names
+from utils.report import REPORTS, report_class
+
+
+# header is the first row of the Replicon Export
+def validate_header(header):
     # check if column names are in English
-    export_wb = openpyxl.load_workbook(file)
-    sheet = export_wb.active
-    if sheet["A1"].value != "Entry Date":
+    if not header or header[0] != "Entry Date":
+        raise TypeError
+    missing = [name for name in column_names if name not in header]
+    if missing:
+        logging.warning(f"Replicon Export is missing the columns: {missing}")
         raise TypeError
     # may be extended for further validation
     logging.info("Sucessfully validated input file.")
-    
\ No newline at end of file
+
+
+# a schema is a type (or tuple of types) or a dict with the type and the required
+# and optional keys of a mapping, or the schema of all values of a mapping
+CELL = re.compile(r"^[A-Z]{1,3}[1-9][0-9]*$")
+
+CONFIG_SCHEMA = {
+    "type": dict,
+    "keys": {
+        "logging": {"type": dict, "optional": {"logs_dir": str, "level": str}},
+        "Categories": {"type": dict, "optional": {"additional_comments_for_codes": {"type": list, "items": str}},
+                       "values": (str, type(None))},
+        "Clients": {"type": dict, "values": {"type": dict, "keys": {"id": int}}},
+    },
+    "optional": {
+        "Grades": {"type": dict, "values": str},
+        "cache": {"type": dict, "optional": {"dir": str, "max_size_mb": (int, float), "enabled": bool}},
+        "ingestion": {"type": dict, "optional": {"chunk_size": int, "max_memory_mb": (int, float)}},
+        "output": {"type": dict, "optional": {"compression_level": int, "save_queue": int}},
+    }
+}
+
+
+def check_schema(value, schema, path: str, problems: list) -> None:
+    if schema == "cell":
+        if not isinstance(value, str) or not CELL.match(value):
+            problems.append(f"'{path}' has to be a cell like 'B2', got {value!r}")
+        return
+    if not isinstance(schema, dict):
+        schema = {"type": schema}
+    if not isinstance(value, schema["type"]):
+        problems.append(f"'{path}' has the wrong type {type(value).__name__}")
+        return
+    if "length" in schema and len(value) != schema["length"]:
+        problems.append(f"'{path}' has to have {schema['length']} items")
+    for i, item in enumerate(value if "items" in schema else []):
+        check_schema(item, schema["items"], f"{path}[{i}]", problems)
+    if isinstance(value, dict):
+        keys = {**schema.get("keys", {}), **schema.get("optional", {})}
+        for key in schema.get("keys", {}):
+            if key not in value:
+                problems.append(f"'{path}' is missing '{key}'")
+        for key, item in value.items():
+            if key in keys:
+                check_schema(item, keys[key], f"{path}.{key}", problems)
+            elif "values" in schema:
+                check_schema(item, schema["values"], f"{path}.{key}", problems)
+
+
+def validate_config(config) -> list:
+    # returns the problems of the config, empty if it is valid
+    problems = []
+    check_schema(config, CONFIG_SCHEMA, "config", problems)
+    if problems:
+        return problems
+    for client, client_info in config["Clients"].items():
+        # the schema of a client comes from its report class
+        report = REPORTS.get(client_info["id"])
+        if report is None:
+            problems.append(f"'config.Clients.{client}.id' has to be one of "
+                            f"{', '.join(str(client_id) for client_id in sorted(REPORTS))}")
+            continue
+        check_schema(client_info, report.client_schema(client_info), f"config.Clients.{client}", problems)
+        problems += report.check_config(client, config)
+    return problems
+
+
+def rules_hash() -> str:
+    """
+    Hash of the rules of validate_config: the schemas plus the source of this
+    module and of the modules of the registered reports (e.g. check_config).
+    Configs validated under other rules have to be validated again.
+    """
+    sha = hashlib.sha256(repr(CONFIG_SCHEMA).encode())
+    for client_id in sorted(REPORTS):
+        sha.update(repr((client_id, REPORTS[client_id].config_schema)).encode())
+    for module in sorted({__name__} | {report.__module__ for report in REPORTS.values()}):
+        sha.update(file_hash(sys.modules[module].__file__).encode())
+    return sha.hexdigest()
+
+
+def preflight(data: pd.DataFrame, client: str, config: dict, sheet_names: list) -> list:
+    """
+    Checks the prepared data against the config and the template of the client
+    before any workbook is written. Every distinct employee and task is checked
+    once. Returns the problems, empty if the reports can be created.
+    """
+    return report_class(config.get("Clients").get(client)).preflight(data, client, config, sheet_names)
@@ -0,0 +1,115 @@
+from copy import copy
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles.cell_style import StyleArray
+
+
+# worksheet settings which are taken over from the template as they are
+SHEET_SETTINGS = [
+    "sheet_format", "sheet_properties", "page_margins", "page_setup", "print_options",
+    "views", "protection", "auto_filter", "data_validations", "conditional_formatting",
+    "row_breaks", "col_breaks", "sheet_state"
+]
+
+
+class StyleCopier:
+    """
+    Copies cell styles from a template workbook into a write-only workbook.
+
+    The style ids of both workbooks differ, so every distinct template style is
+    added to the output workbook once and its ids are reused afterwards.
+    """
+
+    def __init__(self):
+        self._styles = {}
+
+    def copy(self, source, target) -> None:
+        # source and target are styleable objects, e.g. cells or dimensions
+        if not source.has_style:
+            return
+        key = tuple(source._style)
+        style = self._styles.get(key)
+        if style is None:
+            target.font = copy(source.font)
+            target.fill = copy(source.fill)
+            target.border = copy(source.border)
+            target.alignment = copy(source.alignment)
+            target.protection = copy(source.protection)
+            target.number_format = source.number_format
+            style = self._styles[key] = tuple(target._style)
+        else:
+            target._style = StyleArray(style)
+
+
+def template_extras(template) -> list:
+    """
+    Returns what a write-only copy of the template would lose: defined names,
+    charts, images, tables, pivot tables, comments and hyperlinks. The copy only
+    keeps values, styles and the settings of copy_sheet_setup.
+    """
+    extras = []
+    if len(template.defined_names):
+        extras.append("defined names")
+    for sheet in template.worksheets:
+        objects = {"defined names": len(sheet.defined_names), "charts": len(sheet._charts),
+                   "images": len(sheet._images), "tables": len(sheet.tables),
+                   "pivot tables": len(sheet._pivots), "hyperlinks": len(sheet._hyperlinks),
+                   "comments": sum(1 for row in sheet.iter_rows() for cell in row if cell.comment)}
+        extras += [f"{name} in '{sheet.title}'" for name, count in objects.items() if count]
+    return extras
+
+
+def create_write_only_workbook(template) -> openpyxl.Workbook:
+    output = openpyxl.Workbook(write_only=True)
+    output.loaded_theme = template.loaded_theme
+    output.calculation = template.calculation
+    return output
+
+
+def copy_sheet_setup(template_sheet, sheet, styles: StyleCopier) -> None:
+    """
+    Copies dimensions, merged cells and sheet settings of a template sheet into
+    a write-only sheet, this has to happen before any row is written.
+    """
+    for setting in SHEET_SETTINGS:
+        setattr(sheet, setting, copy(getattr(template_sheet, setting)))
+    sheet.page_setup.worksheet = sheet
+    for dimensions, target in ((template_sheet.column_dimensions, sheet.column_dimensions),
+                               (template_sheet.row_dimensions, sheet.row_dimensions)):
+        for key, dimension in dimensions.items():
+            new_dimension = copy(dimension)
+            new_dimension.parent = sheet
+            new_dimension._style = None
+            styles.copy(dimension, new_dimension)
+            target[key] = new_dimension
+    for merged_range in template_sheet.merged_cells.ranges:
+        sheet.merged_cells.add(merged_range.coord)
+    if template_sheet.print_title_rows:
+        sheet.print_title_rows = template_sheet.print_title_rows
+    if template_sheet.print_title_cols:
+        sheet.print_title_cols = template_sheet.print_title_cols
+    if template_sheet.print_area:
+        sheet.print_area = template_sheet.print_area
+
+
+def copy_rows(template_sheet, sheet, styles: StyleCopier, max_row: int = None) -> int:
+    # appends the rows of the template sheet (up to max_row) with values and styles,
+    # returns the number of cells written
+    written = 0
+    for row in template_sheet.iter_rows(max_row=max_row):
+        values = []
+        for template_cell in row:
+            value = getattr(template_cell, "_value", None)
+            if value is None and not template_cell.has_style:
+                values.append(None)
+                continue
+            cell = WriteOnlyCell(sheet)
+            if value is not None:
+                cell._value = value
+                cell.data_type = template_cell.data_type
+            styles.copy(template_cell, cell)
+            values.append(cell)
+            written += 1
+        sheet.append(values)
+    return written